@@ -0,0 +1,109 @@
+import random
+
+import pytest
+from batch_alu import calculate_batch, calculate_batch_python
+from constants import MAX_NUMBER, MIN_NUMBER, WORD_SIZE
+from isa import Opcode
+from machine import ALU_OPERATIONS, Alu, truncating_div, truncating_mod, wrap_word
+
+BINARY_OPCODES = [Opcode.ADD, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.MOD, Opcode.CMP]
+EDGE_VALUES = [0, 1, -1, 2, -2, 3, -3, 7, -7, MAX_NUMBER, MIN_NUMBER, MAX_NUMBER - 1, MIN_NUMBER + 1]
+
+
+def operand_pairs(seed: int, count: int = 500) -> list[tuple[int, int]]:
+    rng = random.Random(seed)
+    pairs = [(x, y) for x in EDGE_VALUES for y in EDGE_VALUES]
+    for _ in range(count):
+        bits = rng.choice([4, 16, WORD_SIZE - 1])
+        pairs.append((rng.randint(-(2**bits), 2**bits - 1), rng.randint(-(2**bits), 2**bits - 1)))
+    return [(wrap_word(x), wrap_word(y)) for x, y in pairs]
+
+
+def exact(opcode: Opcode, left: int, right: int) -> int:
+    return {
+        Opcode.ADD: left + right,
+        Opcode.SUB: left - right,
+        Opcode.CMP: left - right,
+        Opcode.MUL: left * right,
+        Opcode.INC: left + 1,
+        Opcode.DEC: left - 1,
+    }[opcode]
+
+
+def test_word_range():
+    assert MIN_NUMBER == -(2 ** (WORD_SIZE - 1))
+    assert MAX_NUMBER == 2 ** (WORD_SIZE - 1) - 1
+    assert wrap_word(MAX_NUMBER + 1) == MIN_NUMBER
+    assert wrap_word(MIN_NUMBER - 1) == MAX_NUMBER
+    for value in [*EDGE_VALUES, 2**40 + 5, -(2**40) - 5, 10**20]:
+        wrapped = wrap_word(value)
+        assert MIN_NUMBER <= wrapped <= MAX_NUMBER
+        assert (wrapped - value) % 2**WORD_SIZE == 0
+        assert wrap_word(wrapped) == wrapped
+
+
+@pytest.mark.parametrize("opcode", [Opcode.ADD, Opcode.SUB, Opcode.CMP, Opcode.MUL, Opcode.INC, Opcode.DEC])
+def test_ring_operations_wrap_exact_result(opcode):
+    alu = Alu()
+    for left, right in operand_pairs(1):
+        value = alu.calculate(left, right, opcode)
+        assert value == wrap_word(exact(opcode, left, right))
+        assert alu.z_flag == (0 if value == 0 else 1)
+
+
+def test_truncating_division():
+    alu = Alu()
+    for left, right in operand_pairs(2):
+        if right == 0:
+            with pytest.raises(ZeroDivisionError):
+                alu.calculate(left, right, Opcode.DIV)
+            continue
+        quotient = truncating_div(left, right)
+        remainder = truncating_mod(left, right)
+        assert left == right * quotient + remainder
+        assert abs(remainder) < abs(right)
+        assert remainder == 0 or (remainder < 0) == (left < 0)
+        assert alu.calculate(left, right, Opcode.DIV) == wrap_word(quotient)
+        assert alu.calculate(left, right, Opcode.MOD) == remainder
+
+    assert alu.calculate(-7, 2, Opcode.DIV) == -3
+    assert alu.calculate(-7, 2, Opcode.MOD) == -1
+    assert alu.calculate(MIN_NUMBER, -1, Opcode.DIV) == MIN_NUMBER
+    assert alu.calculate(10**17 + 1, 3, Opcode.DIV) == wrap_word((10**17 + 1) // 3)
+
+
+def test_in_range_results_are_unchanged():
+    alu = Alu()
+    for left, right in operand_pairs(3):
+        for opcode in [Opcode.ADD, Opcode.SUB, Opcode.MUL]:
+            value = exact(opcode, left, right)
+            if MIN_NUMBER <= value <= MAX_NUMBER:
+                assert alu.calculate(left, right, opcode) == value
+        if left >= 0 and right > 0:
+            assert alu.calculate(left, right, Opcode.DIV) == left // right
+            assert alu.calculate(left, right, Opcode.MOD) == left % right
+
+
+def test_overflow_counter():
+    alu = Alu()
+    alu.calculate(MAX_NUMBER, 0, Opcode.INC)
+    alu.calculate(MIN_NUMBER, 0, Opcode.DEC)
+    alu.calculate(1, 2, Opcode.ADD)
+    assert alu.overflows == 2
+
+
+@pytest.mark.parametrize("opcode", sorted(ALU_OPERATIONS, key=str))
+def test_batch_matches_scalar(opcode):
+    pairs = [(x, y) for x, y in operand_pairs(4) if y != 0]
+    lefts, rights = [x for x, _ in pairs], [y for _, y in pairs]
+    expected = [Alu().calculate(x, y, opcode) for x, y in pairs]
+
+    assert calculate_batch_python(opcode, lefts, rights) == expected
+    assert calculate_batch(opcode, lefts, rights) == expected
+    assert calculate_batch(opcode, [*lefts, 2**40], [*rights, 1])[:-1] == expected
+
+
+@pytest.mark.parametrize("opcode", [Opcode.DIV, Opcode.MOD])
+def test_batch_division_by_zero(opcode):
+    with pytest.raises(ZeroDivisionError):
+        calculate_batch(opcode, [1, 2], [1, 0])
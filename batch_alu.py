@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from constants import MAX_NUMBER, MIN_NUMBER, WORD_MASK
+from isa import Opcode
+from machine import ALU_OPERATIONS, wrap_word
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIVISION_OPCODES: set[Opcode] = {Opcode.DIV, Opcode.MOD}
+
+
+def calculate_batch_python(opcode: Opcode, lefts: list[int], rights: list[int]) -> list[int]:
+    operation = ALU_OPERATIONS[opcode]
+    return [wrap_word(operation(left, right)) for left, right in zip(lefts, rights)]
+
+
+def as_word_array(values: list[int]) -> np.ndarray | None:
+    try:
+        array = np.asarray(values, dtype=np.int64)
+    except OverflowError:
+        return None
+    if ((array < MIN_NUMBER) | (array > MAX_NUMBER)).any():
+        return None
+    return array
+
+
+def calculate_batch_numpy(opcode: Opcode, left: np.ndarray, right: np.ndarray) -> list[int]:
+    if opcode == Opcode.ADD:
+        values = left + right
+    elif opcode in (Opcode.SUB, Opcode.CMP):
+        values = left - right
+    elif opcode == Opcode.MUL:
+        values = left * right
+    elif opcode == Opcode.INC:
+        values = left + 1
+    elif opcode == Opcode.DEC:
+        values = left - 1
+    else:
+        quotient = np.abs(left) // np.abs(right)
+        quotient = np.where((left < 0) == (right < 0), quotient, -quotient)
+        values = quotient if opcode == Opcode.DIV else left - right * quotient
+    return (((values - MIN_NUMBER) & WORD_MASK) + MIN_NUMBER).tolist()
+
+
+def calculate_batch(opcode: Opcode, lefts: list[int], rights: list[int] | None = None) -> list[int]:
+    assert opcode in ALU_OPERATIONS, f"Unknown alu operation code: {opcode}"
+    if rights is None:
+        rights = [0] * len(lefts)
+    assert len(lefts) == len(rights), "Operand batches must have the same length"
+    if np is not None:
+        left, right = as_word_array(lefts), as_word_array(rights)
+        if left is not None and right is not None and (opcode not in DIVISION_OPCODES or right.all()):
+            return calculate_batch_numpy(opcode, left, right)
+    return calculate_batch_python(opcode, lefts, rights)
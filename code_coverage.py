@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import INSTRUCTIONS_LIMIT, MEMORY_SIZE
+from isa import MemoryCell, Opcode, read_code
+from machine import ControlUnit, read_input, simulation
+
+COVERAGE_MAGIC: bytes = b"SMCV\x01"
+BITMAP_BYTES: int = MEMORY_SIZE // 8
+
+
+class CoverageMap:
+    def __init__(self, data: bytes | None = None):
+        if data is None:
+            self.pcs: bytearray = bytearray(BITMAP_BYTES)
+            self.taken: bytearray = bytearray(BITMAP_BYTES)
+            self.not_taken: bytearray = bytearray(BITMAP_BYTES)
+            self.runs: int = 0
+            return
+        assert data.startswith(COVERAGE_MAGIC), "Not a coverage bitmap"
+        offset = len(COVERAGE_MAGIC)
+        self.runs = int.from_bytes(data[offset : offset + 4], "little")
+        offset += 4
+        self.pcs = bytearray(data[offset : offset + BITMAP_BYTES])
+        self.taken = bytearray(data[offset + BITMAP_BYTES : offset + 2 * BITMAP_BYTES])
+        self.not_taken = bytearray(data[offset + 2 * BITMAP_BYTES : offset + 3 * BITMAP_BYTES])
+
+    def to_bytes(self) -> bytes:
+        return COVERAGE_MAGIC + self.runs.to_bytes(4, "little") + self.pcs + self.taken + self.not_taken
+
+    def merge(self, other: CoverageMap) -> None:
+        for mine, theirs in ((self.pcs, other.pcs), (self.taken, other.taken), (self.not_taken, other.not_taken)):
+            merged = int.from_bytes(mine, "little") | int.from_bytes(theirs, "little")
+            mine[:] = merged.to_bytes(BITMAP_BYTES, "little")
+        self.runs += other.runs
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CoverageMap) and self.to_bytes() == other.to_bytes()
+
+    def covered(self, pc: int) -> bool:
+        return bool(self.pcs[pc >> 3] & (1 << (pc & 7)))
+
+    def edges(self, pc: int) -> tuple[bool, bool]:
+        bit = 1 << (pc & 7)
+        return bool(self.taken[pc >> 3] & bit), bool(self.not_taken[pc >> 3] & bit)
+
+
+class CoverageCollector:
+    def __init__(self):
+        self.coverage: CoverageMap = CoverageMap()
+
+    def attach(self, control_unit: ControlUnit) -> None:
+        datapath = control_unit.datapath
+        pcs, taken, not_taken = self.coverage.pcs, self.coverage.taken, self.coverage.not_taken
+        execute_control_flow = control_unit.decode_and_execute_control_flow_instruction
+
+        def decode_and_execute_control_flow_instruction(opcode: Opcode) -> bool:
+            pc = datapath.pc
+            index, bit = pc >> 3, 1 << (pc & 7)
+            pcs[index] |= bit
+            if opcode == Opcode.JZ:
+                (taken if datapath.alu.z_flag == 0 else not_taken)[index] |= bit
+            elif opcode == Opcode.JNZ:
+                (taken if datapath.alu.z_flag == 1 else not_taken)[index] |= bit
+            return execute_control_flow(opcode)
+
+        control_unit.decode_and_execute_control_flow_instruction = decode_and_execute_control_flow_instruction
+        self.coverage.runs += 1
+
+    def run(self, control_unit: ControlUnit) -> None:
+        self.attach(control_unit)
+        while control_unit.instructions < INSTRUCTIONS_LIMIT:
+            control_unit.decode_and_execute_instruction()
+
+
+def collect(code: list[MemoryCell], input_data: list[int]) -> CoverageMap:
+    collector = CoverageCollector()
+    simulation(code, input_data, runner=collector.run)
+    return collector.coverage
+
+
+def collect_bytes(code: list[MemoryCell], input_data: list[int]) -> bytes:
+    return collect(code, input_data).to_bytes()
+
+
+def collect_batch(code: list[MemoryCell], inputs: list[list[int]], workers: int = 1) -> CoverageMap:
+    coverage = CoverageMap()
+    if workers <= 1:
+        for input_data in inputs:
+            coverage.merge(collect(code, input_data))
+        return coverage
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for data in executor.map(collect_bytes, [code] * len(inputs), inputs):
+            coverage.merge(CoverageMap(data))
+    return coverage
+
+
+def instructions(code: list[MemoryCell]) -> dict[int, MemoryCell]:
+    return {cell.address: cell for cell in code if isinstance(cell, MemoryCell) and cell.opcode is not None}
+
+
+def edge_mark(cell: MemoryCell, coverage: CoverageMap) -> str:
+    if cell.opcode not in (Opcode.JZ, Opcode.JNZ):
+        return "    "
+    is_taken, is_not_taken = coverage.edges(cell.address)
+    return f"[{'T' if is_taken else ' '}{'N' if is_not_taken else ' '}]"
+
+
+def report(code: list[MemoryCell], coverage: CoverageMap, source_map: dict | None = None) -> str:
+    cells = instructions(code)
+    branches = [addr for addr, cell in cells.items() if cell.opcode in (Opcode.JZ, Opcode.JNZ)]
+    lines: dict[int, tuple[int, str]] = {}
+    labels: dict[int, list[str]] = {}
+    if source_map is not None:
+        lines = {x["addr"]: (x["line"], x["text"]) for x in source_map["instructions"]}
+        for name, addr in source_map["labels"].items():
+            labels.setdefault(addr, []).append(name)
+
+    out: list[str] = []
+    for addr, cell in cells.items():
+        for name in labels.get(addr, ()):
+            out.append(f"{'':>18}{name}:")
+        line, text = lines.get(addr, ("", f"{cell.opcode} {'' if cell.arg is None else cell.arg}".strip()))
+        mark = "+" if coverage.covered(addr) else "-"
+        out.append(f"{line:>5} {addr:>5} {mark} {edge_mark(cell, coverage)} {text}")
+
+    covered = sum(coverage.covered(addr) for addr in cells)
+    edges = sum(sum(coverage.edges(addr)) for addr in branches)
+    out.append(
+        f"runs: {coverage.runs}, instructions: {covered}/{len(cells)}, branch edges: {edges}/{2 * len(branches)}"
+    )
+    starts = sorted(labels)
+    for start, end in zip(starts, [*starts[1:], MEMORY_SIZE]):
+        block = [addr for addr in cells if start <= addr < end]
+        block_covered = sum(coverage.covered(addr) for addr in block)
+        out.append(f"{', '.join(labels[start])}: {block_covered}/{len(block)}")
+    return "\n".join(out)
+
+
+def main(source_code_fn: str, source_map_fn: str, workers: int, input_fns: list[str]) -> None:
+    machine_code: list[MemoryCell] = read_code(source_code_fn)
+    with open(source_map_fn, encoding="utf-8") as f:
+        source_map = json.load(f)
+
+    coverage = collect_batch(machine_code, [read_input(fn) for fn in input_fns], workers)
+    print(report(machine_code, coverage, source_map))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 5, (
+        "Usage: code_coverage.py <machine_code_file> <source_map_file> <workers> <input_file> [<input_file> ...]"
+    )
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(funcName)s:%(message)s")
+    main(sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4:])
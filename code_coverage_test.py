@@ -0,0 +1,67 @@
+import translator
+from code_coverage import CoverageMap, collect, collect_batch, report
+from isa import Opcode
+from program_loader import load_program
+
+HELLO = [5, *[ord(x) for x in "hello"]]
+ONE_CHAR = [1, ord("a")]
+JZ_STOP = 15
+
+
+def cat_source_map() -> dict:
+    with open("examples/cat.txt", encoding="utf-8") as f:
+        return translator.source_map(translator.translate_program(f.read()))
+
+
+def test_source_map_points_to_instructions():
+    code = load_program("examples/cat.txt")
+    with open("examples/cat.txt", encoding="utf-8") as f:
+        source_lines = f.read().splitlines()
+    source_map = cat_source_map()
+
+    assert len(source_map["instructions"]) == len([x for x in code if x.opcode is not None])
+    for entry in source_map["instructions"]:
+        assert entry["text"].split()[0] == str(code[entry["addr"]].opcode)
+        assert source_lines[entry["line"] - 1].strip() == entry["text"]
+    assert source_map["labels"] == {"loop": 6, "stop": 22}
+    assert source_map["variables"] == {"count": 1, "length": 2}
+
+
+def test_branch_edges_and_merge():
+    code = load_program("examples/cat.txt")
+    short = collect(code, list(ONE_CHAR))
+    full = collect(code, list(HELLO))
+
+    assert short.edges(JZ_STOP) == (True, False)
+    assert full.edges(JZ_STOP) == (True, True)
+    assert not short.covered(16)
+    assert full.covered(16)
+
+    merged = CoverageMap(short.to_bytes())
+    merged.merge(full)
+    other = CoverageMap(full.to_bytes())
+    other.merge(short)
+    assert merged == other
+    assert merged.pcs == full.pcs
+    assert merged.runs == 2
+
+    merged.merge(CoverageMap(merged.to_bytes()))
+    assert merged.pcs == full.pcs
+
+
+def test_parallel_batch_matches_sequential():
+    code = load_program("examples/cat.txt")
+    inputs = [list(ONE_CHAR), list(HELLO), [2, ord("x"), ord("y")]]
+
+    assert collect_batch(code, inputs, workers=2) == collect_batch(code, inputs)
+
+
+def test_report_maps_to_source():
+    code = load_program("examples/cat.txt")
+    text = report(code, collect(code, list(ONE_CHAR)), cat_source_map())
+
+    assert "   19    15 + [T ] jz stop" in text
+    assert "   21    16 -      lit count" in text
+    assert "runs: 1, instructions: 14/20, branch edges: 1/2" in text
+    assert "loop: 10/16" in text
+    assert str(Opcode.HALT) in text
@@ -2,7 +2,13 @@ MEMORY_SIZE: int = 2048
 DATA_STACK_SIZE: int = 1024
 ADDRESS_STACK_SIZE: int = 1024
 WORD_SIZE = 32
-MIN_NUMBER = -(2**WORD_SIZE - 1)
+BYTE_SIZE = 8
+BYTES_PER_WORD = WORD_SIZE // BYTE_SIZE
+MIN_NUMBER = -(2 ** (WORD_SIZE - 1))
 MAX_NUMBER = 2 ** (WORD_SIZE - 1) - 1
+WORD_MASK = 2**WORD_SIZE - 1
 
 INSTRUCTIONS_LIMIT: int = 3000
+
+INTERRUPT_VECTOR_ADDRESS: int = 1
+INTERRUPT_VECTOR_NAME: str = "int_vector"
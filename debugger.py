@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import logging
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, TextIO
+
+from constants import INSTRUCTIONS_LIMIT
+from exception import HaltProgramError
+from isa import MemoryCell, read_code
+from machine import ControlUnit, DataPath, print_output, read_input, simulation
+from timetravel import TimeTravelRecorder
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+CONDITION_BUILTINS: dict[str, Callable] = {
+    "abs": abs,
+    "bool": bool,
+    "chr": chr,
+    "len": len,
+    "max": max,
+    "min": min,
+    "ord": ord,
+}
+
+EXPRESSION_TEMPLATE = """
+def expression(control_unit, old=None, new=None):
+    datapath = control_unit.datapath
+    pc = datapath.pc
+    stack = datapath.data_stack
+    tos = stack[-1] if stack else None
+    astack = datapath.address_stack
+    tods1 = datapath.data_tos_reg_1
+    tods2 = datapath.data_tos_reg_2
+    toas = datapath.address_tos_reg_1
+    z = datapath.alu.z_flag
+    ticks = control_unit.ticks
+    instructions = control_unit.instructions
+    mem = MemoryView(datapath.memory)
+    return {expression}
+"""
+
+
+class MemoryView:
+    def __init__(self, memory: list[MemoryCell | int]):
+        self.memory = memory
+
+    def __getitem__(self, addr: int) -> int | None:
+        cell = self.memory[addr]
+        if isinstance(cell, MemoryCell):
+            return cell.arg
+        return cell
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+
+def compile_expression(expression: str) -> Callable[..., object]:
+    compile(expression, "<expression>", "eval")
+    namespace: dict = {"MemoryView": MemoryView, "__builtins__": CONDITION_BUILTINS}
+    exec(EXPRESSION_TEMPLATE.format(expression=expression), namespace)
+    return namespace["expression"]
+
+
+def compile_condition(condition: str | None) -> Callable[..., bool] | None:
+    if condition is None or condition.strip() == "":
+        return None
+    return compile_expression(f"bool({condition})")
+
+
+@dataclass
+class Breakpoint:
+    addr: int
+    condition: str | None = None
+    predicate: Callable[..., bool] | None = None
+
+
+@dataclass
+class Watchpoint:
+    addr: int
+    condition: str | None = None
+    predicate: Callable[..., bool] | None = None
+
+
+class Debugger:
+    def __init__(
+        self,
+        stdin: TextIO = sys.stdin,
+        stdout: TextIO = sys.stdout,
+        history: TimeTravelRecorder | None = None,
+    ):
+        self.breakpoints: dict[int, list[Breakpoint]] = {}
+        self.watchpoints: dict[int, Watchpoint] = {}
+        self.stepping: bool = False
+        self.stop_reason: str | None = None
+        self.stdin: TextIO = stdin
+        self.stdout: TextIO = stdout
+        self.control_unit: ControlUnit | None = None
+        self.watching: bool = False
+        self.history: TimeTravelRecorder | None = history
+        self.rewound: bool = False
+
+    def add_breakpoint(self, addr: int, condition: str | None = None) -> None:
+        self.breakpoints.setdefault(addr, []).append(Breakpoint(addr, condition, compile_condition(condition)))
+
+    def add_watchpoint(self, addr: int, condition: str | None = None) -> None:
+        self.watchpoints[addr] = Watchpoint(addr, condition, compile_condition(condition))
+        if self.control_unit is not None:
+            self.install_watchpoints(self.control_unit.datapath)
+
+    def remove(self, addr: int) -> None:
+        self.breakpoints.pop(addr, None)
+        self.watchpoints.pop(addr, None)
+
+    def install_watchpoints(self, datapath: DataPath) -> None:
+        if self.watching:
+            return
+        self.watching = True
+        write_mem = datapath.signal_write_mem
+        memory = MemoryView(datapath.memory)
+
+        def signal_write_mem(addr: int, value: int) -> None:
+            watchpoint = self.watchpoints.get(addr)
+            if watchpoint is None:
+                write_mem(addr, value)
+                return
+            old = memory[addr]
+            write_mem(addr, value)
+            if watchpoint.predicate is None or watchpoint.predicate(self.control_unit, old, value):
+                self.stop_reason = f"watchpoint {addr}: {old} -> {value}"
+
+        datapath.signal_write_mem = signal_write_mem
+
+    def should_break(self, control_unit: ControlUnit) -> bool:
+        for point in self.breakpoints.get(control_unit.datapath.pc, ()):
+            if point.predicate is None or point.predicate(control_unit):
+                return True
+        return False
+
+    def run(self, control_unit: ControlUnit) -> None:
+        self.control_unit = control_unit
+        if self.watchpoints:
+            self.install_watchpoints(control_unit.datapath)
+        execute = control_unit.decode_and_execute_instruction
+        if self.history is not None:
+            self.history.attach(control_unit)
+            execute = self.execute
+
+        stopped = False
+        while control_unit.instructions < INSTRUCTIONS_LIMIT:
+            if not (self.breakpoints or self.watchpoints or self.stepping):
+                while control_unit.instructions < INSTRUCTIONS_LIMIT:
+                    execute()
+                    if self.stepping:
+                        break
+                continue
+            if not stopped and control_unit.datapath.pc in self.breakpoints and self.should_break(control_unit):
+                self.repl(control_unit, f"breakpoint {control_unit.datapath.pc}")
+
+            execute()
+
+            stopped = self.stop_reason is not None or self.stepping
+            if self.stop_reason is not None:
+                reason, self.stop_reason = self.stop_reason, None
+                self.stepping = False
+                self.repl(control_unit, reason)
+            elif self.stepping:
+                self.stepping = False
+                self.repl(control_unit, "step")
+
+    def execute(self) -> None:
+        try:
+            self.history.step()
+        except HaltProgramError:
+            self.rewound = False
+            self.stop_reason = None
+            self.repl(self.control_unit, "halt")
+            if not self.rewound:
+                raise
+
+    def commands(self) -> Iterator[list[str]]:
+        while True:
+            self.stdout.write("(debug) ")
+            self.stdout.flush()
+            line = self.stdin.readline()
+            if line == "":
+                yield ["continue"]
+                return
+            yield line.split()
+
+    def repl(self, control_unit: ControlUnit, reason: str) -> None:
+        print(f"stopped at pc {control_unit.datapath.pc} ({reason})", file=self.stdout)
+        for command in self.commands():
+            if not command:
+                continue
+            name, args = command[0], command[1:]
+            if name in ("c", "continue"):
+                return
+            if name in ("s", "step"):
+                self.stepping = True
+                return
+            if name in ("q", "quit"):
+                raise HaltProgramError()
+            self.execute_command(control_unit, name, args)
+
+    def execute_command(self, control_unit: ControlUnit, name: str, args: list[str]) -> None:
+        try:
+            if name in ("i", "inspect"):
+                print(control_unit.__repr__().rstrip(), file=self.stdout)
+            elif name in ("p", "print"):
+                print(compile_expression(" ".join(args))(control_unit), file=self.stdout)
+            elif name in ("x", "mem"):
+                start = int(args[0])
+                count = int(args[1]) if len(args) > 1 else 1
+                memory = MemoryView(control_unit.datapath.memory)
+                print(f"{start}: {[memory[x] for x in range(start, start + count)]}", file=self.stdout)
+            elif name in ("b", "break"):
+                self.add_breakpoint(int(args[0]), self.condition_arg(args))
+            elif name in ("w", "watch"):
+                self.add_watchpoint(int(args[0]), self.condition_arg(args))
+            elif name in ("d", "delete"):
+                self.remove(int(args[0]))
+            elif name in ("sb", "step-back", "rb", "run-back", "lw", "last-write") and self.history is None:
+                print("Reverse debugging is disabled", file=self.stdout)
+            elif name in ("sb", "step-back"):
+                self.rewind(control_unit, self.history.step_back())
+            elif name in ("rb", "run-back"):
+                self.rewind(control_unit, self.history.run_back_to_tick(int(args[0])))
+            elif name in ("lw", "last-write"):
+                write = self.history.last_write(int(args[0]))
+                if write is None:
+                    print(f"{args[0]}: no writes in history", file=self.stdout)
+                else:
+                    print(
+                        f"{args[0]}: {write.old} -> {write.new} at pc {write.pc}, "
+                        f"tick {write.tick}, instruction {write.instruction}",
+                        file=self.stdout,
+                    )
+            else:
+                print(f"Unknown command: {name}", file=self.stdout)
+        except (IndexError, ValueError, SyntaxError, NameError, TypeError, KeyError) as e:
+            print(f"Error: {e}", file=self.stdout)
+
+    def rewind(self, control_unit: ControlUnit, moved: bool) -> None:
+        self.stop_reason = None
+        if not moved:
+            print(f"History starts at tick {self.history.oldest_tick()}", file=self.stdout)
+            return
+        self.rewound = True
+        print(f"at pc {control_unit.datapath.pc}, tick {control_unit.ticks}", file=self.stdout)
+
+    def condition_arg(self, args: list[str]) -> str | None:
+        if len(args) > 2 and args[1] == "if":
+            return " ".join(args[2:])
+        return None
+
+
+def parse_point(spec: str) -> tuple[str, int, str | None]:
+    kind, addr, *condition = spec.split(":", 2)
+    assert kind in ("b", "w"), f"Unknown point kind {kind}, use b:<addr>[:<condition>] or w:<addr>[:<condition>]"
+    return kind, int(addr), condition[0] if condition else None
+
+
+def main(source_code_fn: str, input_data_fn: str, points: list[str]) -> None:
+    machine_code: list[MemoryCell] = read_code(source_code_fn)
+    input_str: list[int] = read_input(input_data_fn)
+
+    debugger = Debugger()
+    for spec in points:
+        if spec.split(":")[0] == "tt":
+            debugger.history = TimeTravelRecorder(*[int(x) for x in spec.split(":")[1:]])
+            continue
+        kind, addr, condition = parse_point(spec)
+        if kind == "b":
+            debugger.add_breakpoint(addr, condition)
+        else:
+            debugger.add_watchpoint(addr, condition)
+
+    print_output(simulation(machine_code, input_str, runner=debugger.run))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 3, (
+        "Usage: debugger.py <source_code_fn> <input_data_fn> [b:<addr>[:<condition>]] [w:<addr>[:<condition>]] "
+        "[tt[:<snapshot_interval>[:<memory_budget>]]]"
+    )
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(funcName)s:%(message)s")
+    main(sys.argv[1], sys.argv[2], sys.argv[3:])
@@ -0,0 +1,48 @@
+import io
+
+from debugger import Debugger
+from machine import simulation
+from program_loader import load_program
+
+HELLO = [5, *[ord(x) for x in "hello"]]
+
+
+def run_debugger(commands: str, points: list[tuple[str, int, str | None]]) -> tuple[tuple, str]:
+    code = load_program("examples/cat.txt")
+    stdout = io.StringIO()
+    debugger = Debugger(io.StringIO(commands), stdout)
+    for kind, addr, condition in points:
+        if kind == "b":
+            debugger.add_breakpoint(addr, condition)
+        else:
+            debugger.add_watchpoint(addr, condition)
+    return simulation(code, list(HELLO), runner=debugger.run), stdout.getvalue()
+
+
+def test_debugger_without_points_matches_simulation():
+    code = load_program("examples/cat.txt")
+    assert simulation(code, list(HELLO), runner=Debugger().run) == simulation(code, list(HELLO))
+
+
+def test_conditional_breakpoint():
+    res, output = run_debugger("p tos\nc\n", [("b", 7, "tos == ord('l')")])
+
+    assert output.count("stopped at pc 7 (breakpoint 7)") == 2
+    assert "(debug) 108" in output
+    assert res == simulation(load_program("examples/cat.txt"), list(HELLO))
+
+
+def test_watchpoint_and_step():
+    res, output = run_debugger("s\np pc\nc\n", [("w", 1, "new == 4")])
+
+    assert "(watchpoint 1: 3 -> 4)" in output
+    assert "stopped at pc 6 (step)" in output
+    assert "(debug) 6" in output
+    assert res[0] == [ord(x) for x in "hello"]
+
+
+def test_quit_stops_simulation():
+    res, output = run_debugger("q\n", [("b", 7, None)])
+
+    assert res[0] == []
+    assert output.count("stopped at") == 1
@@ -24,3 +24,8 @@ class UnexpectedVariableError(Exception):
 class VariableOrLabelNotDefinedError(Exception):
     def __init__(self, var: int | list[int] | None) -> None:
         super().__init__(f"Variable or label {var} not defined")
+
+
+class DuplicateSymbolError(Exception):
+    def __init__(self, symbol: str) -> None:
+        super().__init__(f"Symbol {symbol} is defined in multiple modules")
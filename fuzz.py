@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import random
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from code_coverage import CoverageCollector
+from constants import BYTES_PER_WORD, INSTRUCTIONS_LIMIT, MAX_NUMBER, MIN_NUMBER
+from debugger import Debugger
+from hotloop import HotLoopRunner
+from isa import MemoryCell, decode_code
+from linker import compile_module, link
+from machine import simulation
+from memoization import CallCache
+from metrics import MetricsCollector
+from multicore import multicore_simulation
+from timetravel import TimeTravelRecorder
+from tracing import TraceRecorder
+from translator import custom_serializer, translate
+
+STRING_CHARS: str = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ,.!?-"
+EDGE_NUMBERS: list[int] = [0, 1, -1, 2, 255, 256, MAX_NUMBER, MIN_NUMBER, MAX_NUMBER - 1, MIN_NUMBER + 1]
+INPUT_SIZE: int = 64
+
+
+class ProgramGenerator:
+    def __init__(self, rng: random.Random, statements: int = 8, loop_depth: int = 2, subroutines: int = 3):
+        self.rng: random.Random = rng
+        self.statements: int = statements
+        self.loop_depth: int = loop_depth
+        self.subroutines: int = subroutines
+        self.data: list[str] = []
+        self.addr: int = 1
+        self.scalars: list[str] = []
+        self.references: list[str] = []
+        self.strings: list[str] = []
+        self.packed_bytes: list[int] = []
+        self.packed: list[str] = []
+        self.callable: list[str] = []
+        self.labels: int = 0
+        self.counters: int = 0
+
+    def label(self, prefix: str) -> str:
+        self.labels += 1
+        return f"{prefix}{self.labels}"
+
+    def declare(self, name: str, value: str, size: int = 1) -> str:
+        self.data.append(f"{name}: {value}")
+        self.addr += size
+        return name
+
+    def number(self) -> int:
+        if self.rng.random() < 0.15:
+            return self.rng.choice(EDGE_NUMBERS)
+        return self.rng.randint(-20, 100)
+
+    def text(self) -> str:
+        return "".join(self.rng.choice(STRING_CHARS) for _ in range(self.rng.randint(1, 9))).strip() or "x"
+
+    def generate_data(self) -> None:
+        for i in range(self.rng.randint(0, 2)):
+            value = self.text()
+            start = self.addr + 1
+            self.declare(f"p{i}", f'.packed "{value}"', 1 + -(-len(value) // BYTES_PER_WORD))
+            self.packed.append(f"p{i}")
+            self.packed_bytes.extend(start * BYTES_PER_WORD + x for x in range(len(value)))
+        for i in range(self.rng.randint(1, 4)):
+            self.scalars.append(self.declare(f"v{i}", str(self.number())))
+        for i in range(self.rng.randint(0, 2)):
+            value = self.text()
+            self.strings.append(self.declare(f"s{i}", f'"{value}"', 1 + len(value)))
+        for i in range(self.rng.randint(0, 2)):
+            self.references.append(self.declare(f"r{i}", self.rng.choice(self.scalars)))
+
+    def counter(self) -> str:
+        self.counters += 1
+        return self.declare(f"c{self.counters}", "0")
+
+    def expression(self, depth: int) -> list[str]:
+        choice = self.rng.randrange(12 if depth > 0 else 4)
+        if choice == 0:
+            return [f"lit {self.number()}"]
+        if choice == 1:
+            return [f"lit {self.rng.choice(self.scalars)}", "push"]
+        if choice == 2 and self.references:
+            return [f"lit {self.rng.choice(self.references)}", "push", "push"]
+        if choice == 3 and self.packed_bytes:
+            return [f"lit {self.rng.choice(self.packed_bytes)}", "pushb"]
+        if choice == 4:
+            op = self.rng.choice(["add", "sub", "mul"])
+            return [*self.expression(depth - 1), *self.expression(depth - 1), op]
+        if choice == 5:
+            divisor = self.rng.choice([x for x in range(-5, 8) if x != 0] + [MAX_NUMBER])
+            return [*self.expression(depth - 1), f"lit {divisor}", self.rng.choice(["div", "mod"])]
+        if choice == 6:
+            return [*self.expression(depth - 1), self.rng.choice(["inc", "dec"])]
+        if choice == 7:
+            return [*self.expression(depth - 1), "dup", self.rng.choice(["add", "mul"])]
+        if choice == 8:
+            return [*self.expression(depth - 1), *self.expression(depth - 1), "switch", "sub"]
+        if choice == 9 and self.callable:
+            return [*self.expression(depth - 1), f"call {self.rng.choice(self.callable)}"]
+        if choice == 10 and self.rng.random() < 0.3:
+            return ["in 0"]
+        if choice == 11 and self.strings:
+            return [f"lit {self.rng.choice(self.strings)}", "push"]
+        return [f"lit {self.number()}"]
+
+    def statement(self, loops: int, in_main: bool) -> list[str]:
+        choice = self.rng.randrange(10)
+        if choice == 0 and self.strings:
+            return [f"lit {self.rng.choice(self.strings)}", "outs 1"]
+        if choice == 1 and self.packed:
+            return [f"lit {self.rng.choice(self.packed)}", "outsb 1"]
+        if choice == 2 and self.packed_bytes:
+            return [*self.expression(1), f"lit {self.rng.choice(self.packed_bytes)}", "popb"]
+        if choice in (3, 4) and loops < self.loop_depth:
+            counter, start = self.counter(), self.label("loop")
+            body = self.block(self.rng.randint(1, 3), loops + 1, in_main)
+            return [
+                f"lit {self.rng.randint(1, 4)}",
+                f"lit {counter}",
+                "pop",
+                f"{start}:",
+                *body,
+                f"lit {counter}",
+                "push",
+                "dec",
+                "dup",
+                f"lit {counter}",
+                "pop",
+                "lit 0",
+                "cmp",
+                "drop",
+                "drop",
+                f"jnz {start}",
+            ]
+        if choice == 5:
+            skip = self.label("skip")
+            body = self.block(self.rng.randint(1, 2), loops, in_main)
+            jump = self.rng.choice(["jz", "jnz"])
+            return [
+                *self.expression(2),
+                *self.expression(1),
+                "cmp",
+                "drop",
+                "drop",
+                f"{jump} {skip}",
+                *body,
+                f"{skip}:",
+            ]
+        if choice == 6:
+            skip = self.label("flag")
+            body = self.block(1, loops, in_main)
+            return [*self.expression(2), f"{self.rng.choice(['jz', 'jnz'])} {skip}", *body, f"{skip}:", "drop"]
+        if choice == 7 and in_main and self.rng.random() < 0.1:
+            return ["halt"]
+        if choice == 8:
+            return [*self.expression(2), f"lit {self.rng.choice(self.scalars)}", "pop"]
+        return [*self.expression(3), "out 1"]
+
+    def block(self, count: int, loops: int, in_main: bool) -> list[str]:
+        return [line for _ in range(count) for line in self.statement(loops, in_main)]
+
+    def subroutine(self, name: str) -> list[str]:
+        body = self.block(self.rng.randint(0, 2), self.loop_depth - 1, False) if self.rng.random() < 0.5 else []
+        tail = self.rng.choice([["inc"], ["dup", "mul"], [f"lit {self.rng.choice(self.scalars)}", "push", "add"]])
+        return [f"{name}:", *body, *tail, "ret"]
+
+    def generate(self) -> str:
+        self.generate_data()
+        routines: list[str] = []
+        for i in range(self.rng.randint(0, self.subroutines)):
+            routines.extend(self.subroutine(f"f{i}"))
+            self.callable.append(f"f{i}")
+        main = self.block(self.rng.randint(1, self.statements), 0, True)
+        lines = ["section .data:", *self.data, "section .text:", *main, "halt", *routines]
+        return "\n".join(lines) + "\n"
+
+
+def generate_program(seed: int) -> str:
+    return ProgramGenerator(random.Random(seed)).generate()
+
+
+def generate_input(seed: int) -> list[int]:
+    rng = random.Random(~seed)
+    return [rng.randint(0, 127) for _ in range(INPUT_SIZE)]
+
+
+def load_translated(source: str) -> list[MemoryCell]:
+    return decode_code(json.loads(json.dumps(translate(source)[0], default=custom_serializer)))
+
+
+def load_linked(source: str) -> list[MemoryCell]:
+    machine_code, _ = link([("main", compile_module(source))])
+    return decode_code(json.loads(json.dumps(machine_code, default=custom_serializer)))
+
+
+def run_debugger(code: list[MemoryCell], input_data: list[int]) -> tuple[list[int], int, int]:
+    debugger = Debugger(io.StringIO(), io.StringIO())
+    debugger.add_breakpoint(0)
+    debugger.add_watchpoint(0, "new != new")
+    return simulation(code, input_data, runner=debugger.run)
+
+
+Runner = Callable[[list[MemoryCell], list[int]], tuple]
+
+CONFIGURATIONS: dict[str, Runner] = {
+    "memoization": lambda code, input_data: simulation(code, input_data, call_cache=CallCache(code)),
+    "tracing": lambda code, input_data: simulation(code, input_data, runner=TraceRecorder().run),
+    "timetravel": lambda code, input_data: simulation(code, input_data, runner=TimeTravelRecorder(16).run),
+    "debugger": run_debugger,
+    "metrics": lambda code, input_data: simulation(code, input_data, metrics=MetricsCollector()),
+    "coverage": lambda code, input_data: simulation(code, input_data, runner=CoverageCollector().run),
+    "multicore": lambda code, input_data: multicore_simulation(code, input_data, 1)[:3],
+    "hotloop": lambda code, input_data: simulation(code, input_data, runner=HotLoopRunner(1).run),
+}
+
+
+@dataclass
+class Finding:
+    kind: str
+    source: str
+    input_data: list[int]
+    expected: tuple | None = None
+    actual: tuple | None = None
+    seed: int | None = None
+
+    def describe(self) -> str:
+        return f"{self.kind}: expected {self.expected}, actual {self.actual}"
+
+
+@dataclass
+class FuzzReport:
+    programs: int = 0
+    instructions: int = 0
+    halted: int = 0
+    seconds: float = 0.0
+    findings: list[Finding] = field(default_factory=list)
+
+    def programs_per_minute(self) -> float:
+        return 60 * self.programs / self.seconds if self.seconds else 0.0
+
+
+def outcome(run: Runner, code: list[MemoryCell], input_data: list[int]) -> tuple:
+    try:
+        output, instructions, ticks = run(code, list(input_data))
+    except (AssertionError, ArithmeticError, AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+        return "error", type(e).__name__, str(e)
+    return "ok", list(output), instructions, ticks
+
+
+def check_program(
+    source: str, input_data: list[int], configurations: dict[str, Runner] | None = None
+) -> tuple[Finding | None, tuple | None]:
+    if configurations is None:
+        configurations = CONFIGURATIONS
+    try:
+        code = load_translated(source)
+    except Exception as e:
+        return Finding("translator", source, input_data, None, (type(e).__name__, str(e))), None
+    try:
+        linked = load_linked(source)
+    except Exception as e:
+        return Finding("linker", source, input_data, None, (type(e).__name__, str(e))), None
+    if [str(x) for x in linked] != [str(x) for x in code]:
+        return Finding("linker", source, input_data, tuple(map(str, code)), tuple(map(str, linked))), None
+
+    expected = outcome(simulation, code, input_data)
+    for name, run in configurations.items():
+        actual = outcome(run, code, input_data)
+        if actual != expected:
+            return Finding(name, source, input_data, expected, actual), expected
+    return None, expected
+
+
+def same_failure(finding: Finding, candidate: Finding | None) -> bool:
+    if candidate is None or candidate.kind != finding.kind:
+        return False
+    if finding.kind in ("translator", "linker") and finding.expected is None:
+        return candidate.actual == finding.actual
+    return True
+
+
+def ddmin(items: list[str], interesting: Callable[[list[str]], bool]) -> list[str]:
+    granularity = 2
+    while len(items) >= 2:
+        chunk = -(-len(items) // granularity)
+        subsets = [items[i : i + chunk] for i in range(0, len(items), chunk)]
+        reduced = False
+        for i in range(len(subsets)):
+            complement = [x for j, subset in enumerate(subsets) if j != i for x in subset]
+            if interesting(subsets[i]):
+                items, granularity, reduced = subsets[i], 2, True
+                break
+            if interesting(complement):
+                items, granularity, reduced = complement, max(granularity - 1, 2), True
+                break
+        if not reduced:
+            if granularity >= len(items):
+                break
+            granularity = min(granularity * 2, len(items))
+    return items
+
+
+def minimize(finding: Finding) -> Finding:
+    configurations = {k: v for k, v in CONFIGURATIONS.items() if k == finding.kind}
+
+    def interesting(lines: list[str]) -> bool:
+        candidate, _ = check_program("\n".join(lines) + "\n", finding.input_data, configurations)
+        return same_failure(finding, candidate)
+
+    lines = ddmin(finding.source.splitlines(), interesting)
+    minimized, _ = check_program("\n".join(lines) + "\n", finding.input_data, configurations)
+    assert minimized is not None, "Minimized program must still fail"
+    minimized.seed = finding.seed
+    return minimized
+
+
+def fuzz_one(seed: int) -> tuple[int, Finding | None, tuple | None]:
+    finding, expected = check_program(generate_program(seed), generate_input(seed))
+    if finding is not None:
+        finding.seed = seed
+    return seed, finding, expected
+
+
+def fuzz(count: int, seed: int = 0, workers: int = 1, shrink: bool = True) -> FuzzReport:
+    report = FuzzReport()
+    start = time.perf_counter()
+    seeds = range(seed, seed + count)
+    if workers <= 1:
+        results = map(fuzz_one, seeds)
+        report = collect_results(report, results)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            report = collect_results(report, executor.map(fuzz_one, seeds, chunksize=64))
+    report.seconds = time.perf_counter() - start
+    if shrink:
+        report.findings = [minimize(x) for x in report.findings]
+    return report
+
+
+def collect_results(report: FuzzReport, results) -> FuzzReport:
+    for _, finding, expected in results:
+        report.programs += 1
+        if finding is not None:
+            report.findings.append(finding)
+        elif expected[0] == "ok":
+            report.instructions += expected[2]
+            report.halted += expected[2] < INSTRUCTIONS_LIMIT
+    return report
+
+
+def main(count: int, seed: int = 0, workers: int = 1, out_dir: str | None = None) -> None:
+    report = fuzz(count, seed, workers)
+    print(
+        f"programs: {report.programs}, halted: {report.halted}, instructions: {report.instructions}, "
+        f"programs/min: {report.programs_per_minute():.0f}, findings: {len(report.findings)}"
+    )
+    for finding in report.findings:
+        print(f"seed {finding.seed}: {finding.describe()}")
+        if out_dir is not None:
+            Path(out_dir).mkdir(parents=True, exist_ok=True)
+            (Path(out_dir) / f"fuzz_{finding.seed}.txt").write_text(finding.source, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    assert 5 >= len(sys.argv) >= 2, "Usage: fuzz.py <count> <seed> - optional <workers> - optional <out_dir> - optional"
+    logging.basicConfig(level=logging.ERROR, format="%(levelname)s: %(funcName)s:%(message)s")
+    args = sys.argv[1:]
+    main(
+        int(args[0]),
+        int(args[1]) if len(args) > 1 else 0,
+        int(args[2]) if len(args) > 2 else 1,
+        args[3] if len(args) > 3 else None,
+    )
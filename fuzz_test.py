@@ -0,0 +1,62 @@
+import fuzz
+from constants import INSTRUCTIONS_LIMIT
+from isa import Opcode
+from machine import simulation
+
+
+def test_generated_programs_are_valid_and_terminate():
+    assert fuzz.generate_program(7) == fuzz.generate_program(7)
+    results = [
+        fuzz.outcome(simulation, fuzz.load_translated(fuzz.generate_program(seed)), fuzz.generate_input(seed))
+        for seed in range(40)
+    ]
+    halted = [x for x in results if x[0] == "ok" and x[2] < INSTRUCTIONS_LIMIT]
+    assert len(halted) >= 30
+
+
+def test_configurations_agree():
+    report = fuzz.fuzz(60, seed=100)
+    assert report.programs == 60
+    assert report.findings == []
+    assert report.instructions > 0
+
+
+def test_parallel_campaign_matches_sequential():
+    sequential = fuzz.fuzz(20, seed=5)
+    parallel = fuzz.fuzz(20, seed=5, workers=2)
+    assert (parallel.programs, parallel.halted, parallel.instructions) == (
+        sequential.programs,
+        sequential.halted,
+        sequential.instructions,
+    )
+
+
+def slow_multiplication(code, input_data):
+    def runner(control_unit):
+        execute_mul = control_unit.executors[Opcode.MUL]
+
+        def execute(opcode):
+            control_unit.tick()
+            execute_mul(opcode)
+
+        control_unit.executors[Opcode.MUL] = execute
+        while control_unit.instructions < INSTRUCTIONS_LIMIT:
+            control_unit.decode_and_execute_instruction()
+
+    return simulation(code, input_data, runner=runner)
+
+
+def test_divergence_is_found_and_minimized(monkeypatch):
+    monkeypatch.setattr(fuzz, "CONFIGURATIONS", {"slow_mul": slow_multiplication})
+    report = fuzz.fuzz(30, seed=0)
+
+    assert report.findings
+    for finding in report.findings:
+        assert finding.kind == "slow_mul"
+        assert "mul" in finding.source
+        assert len(finding.source.splitlines()) <= 12
+        assert finding.expected[3] != finding.actual[3]
+
+
+def test_ddmin():
+    assert fuzz.ddmin(list(range(20)), lambda items: 3 in items and 17 in items) == [3, 17]
@@ -44,7 +44,7 @@ def test_translator_and_machine(golden, caplog):
         with contextlib.redirect_stdout(io.StringIO()) as stdout:
             translator.main(source, target)
             print("============================================================")
-            machine.main(target, input_stream)
+            machine.main(target, input_stream, golden.get("in_arrival_interval"))
 
         with open(target, encoding="utf-8") as f:
             code = f.read()
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import logging
+import sys
+
+from constants import INSTRUCTIONS_LIMIT, MAX_NUMBER, MIN_NUMBER
+from isa import MemoryCell, Opcode, read_code
+from machine import ALU_OPERATIONS, ControlUnit, DataPath, print_output, read_input, simulation, wrap_word
+
+LIT, PUSH, POP, BINARY, UNARY, CMP, DUP, SWITCH, DROP, JMP, JZ, JNZ = range(12)
+
+FAST_OPCODES: dict[Opcode, int] = {
+    Opcode.LIT: LIT,
+    Opcode.PUSH: PUSH,
+    Opcode.POP: POP,
+    Opcode.ADD: BINARY,
+    Opcode.SUB: BINARY,
+    Opcode.MUL: BINARY,
+    Opcode.DIV: BINARY,
+    Opcode.MOD: BINARY,
+    Opcode.INC: UNARY,
+    Opcode.DEC: UNARY,
+    Opcode.CMP: CMP,
+    Opcode.DUP: DUP,
+    Opcode.SWITCH: SWITCH,
+    Opcode.DROP: DROP,
+    Opcode.JMP: JMP,
+    Opcode.JZ: JZ,
+    Opcode.JNZ: JNZ,
+}
+JUMP_OPCODES: set[Opcode] = {Opcode.JMP, Opcode.JZ, Opcode.JNZ}
+ARGUMENT_OPCODES: set[Opcode] = {Opcode.LIT, *JUMP_OPCODES}
+DIVISION_OPCODES: set[Opcode] = {Opcode.DIV, Opcode.MOD}
+HOOKED_DATAPATH_SIGNALS: tuple[str, ...] = (
+    "signal_read_mem",
+    "signal_write_mem",
+    "signal_read_data_stack",
+    "signal_write_data_stack",
+)
+HOOKED_CONTROL_UNIT_METHODS: tuple[str, ...] = (
+    "decode_and_execute_instruction",
+    "decode_and_execute_control_flow_instruction",
+)
+
+
+def is_fast(cell: MemoryCell | int) -> bool:
+    if not isinstance(cell, MemoryCell) or cell.opcode not in FAST_OPCODES:
+        return False
+    return isinstance(cell.arg, int) or cell.opcode not in ARGUMENT_OPCODES
+
+
+class Region:
+    def __init__(self, memory: list[MemoryCell | int], start: int, end: int):
+        self.start: int = start
+        self.end: int = end
+        self.cells: list[MemoryCell] = memory[start : end + 1]
+        self.ops: list[tuple[int, Opcode, int | None, MemoryCell]] = [
+            (FAST_OPCODES[cell.opcode], cell.opcode, cell.arg, cell) for cell in self.cells
+        ]
+
+    def is_valid(self, memory: list[MemoryCell | int]) -> bool:
+        return memory[self.start : self.end + 1] == self.cells
+
+
+class HotLoopRunner:
+    def __init__(self, threshold: int = 2):
+        self.threshold: int = threshold
+        self.counts: dict[int, int] = {}
+        self.regions: dict[int, Region] = {}
+        self.entries: int = 0
+        self.fast_instructions: int = 0
+        self.bailouts: int = 0
+
+    def can_fast_forward(self, control_unit: ControlUnit) -> bool:
+        datapath = control_unit.datapath
+        return (
+            not logging.getLogger().isEnabledFor(logging.DEBUG)
+            and not any(name in vars(datapath) for name in HOOKED_DATAPATH_SIGNALS)
+            and not any(name in vars(control_unit) for name in HOOKED_CONTROL_UNIT_METHODS)
+        )
+
+    def run(self, control_unit: ControlUnit) -> None:
+        if not self.can_fast_forward(control_unit):
+            while control_unit.instructions < INSTRUCTIONS_LIMIT:
+                control_unit.decode_and_execute_instruction()
+            return
+
+        datapath = control_unit.datapath
+        regions = self.regions
+        while control_unit.instructions < INSTRUCTIONS_LIMIT:
+            pc = datapath.pc
+            region = regions.get(pc)
+            if region is not None and self.fast_forward(control_unit, region):
+                continue
+            control_unit.decode_and_execute_instruction()
+            if datapath.pc <= pc and control_unit.cur_instruction in JUMP_OPCODES:
+                self.observe_backward_jump(datapath, datapath.pc, pc)
+
+    def observe_backward_jump(self, datapath: DataPath, target: int, source: int) -> None:
+        count = self.counts.get(target, 0) + 1
+        self.counts[target] = count
+        if count < self.threshold:
+            return
+        memory = datapath.memory
+        addr = target
+        while addr <= source:
+            if not is_fast(memory[addr]) or addr in self.regions:
+                addr += 1
+                continue
+            start, end = addr, addr
+            while start > 0 and is_fast(memory[start - 1]):
+                start -= 1
+            while end + 1 < datapath.mem_size and is_fast(memory[end + 1]):
+                end += 1
+            region = Region(memory, start, end)
+            for x in range(start, end + 1):
+                self.regions[x] = region
+            addr = end + 1
+
+    def fast_forward(self, control_unit: ControlUnit, region: Region) -> bool:
+        datapath = control_unit.datapath
+        memory = datapath.memory
+        call_cache = control_unit.call_cache
+        if control_unit.interrupts_enabled or (call_cache is not None and call_cache.frames):
+            return False
+        if not region.is_valid(memory):
+            self.discard(region)
+            return False
+
+        alu = datapath.alu
+        stack = datapath.data_stack
+        stack_size = datapath.data_stack_size
+        mem_size = datapath.mem_size
+        ops, start, end = region.ops, region.start, region.end
+        pc = datapath.pc
+        tos_1, tos_2, address_tos = datapath.data_tos_reg_1, datapath.data_tos_reg_2, datapath.address_tos_reg_1
+        z_flag = alu.z_flag
+        overflows = 0
+        ticks = control_unit.ticks
+        instructions = control_unit.instructions
+        budget = INSTRUCTIONS_LIMIT - instructions
+        executed = 0
+        cell = None
+
+        while start <= pc <= end and executed < budget:
+            kind, opcode, arg, current = ops[pc - start]
+            depth = len(stack)
+            if kind == LIT:
+                if depth == stack_size:
+                    break
+                tos_1 = arg
+                stack.append(arg)
+                pc += 1
+                ticks += 3
+            elif kind == PUSH:
+                if depth == 0:
+                    break
+                addr = stack[-1]
+                if not (isinstance(addr, int) and 0 <= addr < mem_size and isinstance(memory[addr], MemoryCell)):
+                    break
+                if memory[addr].arg is None:
+                    break
+                stack.pop()
+                address_tos = pc
+                tos_1 = memory[addr].arg
+                stack.append(tos_1)
+                pc += 1
+                ticks += 6
+            elif kind == POP:
+                if depth < 2:
+                    break
+                addr = stack[-1]
+                if not (isinstance(addr, int) and 0 <= addr < mem_size) or addr in self.regions:
+                    break
+                tos_1 = stack.pop()
+                tos_2 = stack.pop()
+                address_tos = pc
+                memory[addr] = MemoryCell(addr, None, tos_2)
+                pc += 1
+                ticks += 6
+            elif kind == BINARY or kind == CMP:
+                if depth < 2 or (opcode in DIVISION_OPCODES and stack[-2] == 0):
+                    break
+                tos_1 = stack.pop()
+                tos_2 = stack.pop()
+                if kind == CMP:
+                    value = tos_2 - tos_1
+                else:
+                    value = ALU_OPERATIONS[opcode](tos_1, tos_2)
+                if value > MAX_NUMBER or value < MIN_NUMBER:
+                    overflows += 1
+                    value = wrap_word(value)
+                z_flag = 0 if value == 0 else 1
+                if kind == CMP:
+                    stack.append(tos_2)
+                    stack.append(tos_1)
+                else:
+                    tos_1 = value
+                    stack.append(value)
+                pc += 1
+                ticks += 5
+            elif kind == UNARY:
+                if depth == 0:
+                    break
+                tos_1 = stack.pop()
+                value = ALU_OPERATIONS[opcode](tos_1, tos_2)
+                if value > MAX_NUMBER or value < MIN_NUMBER:
+                    overflows += 1
+                    value = wrap_word(value)
+                z_flag = 0 if value == 0 else 1
+                tos_1 = value
+                stack.append(value)
+                pc += 1
+                ticks += 4
+            elif kind == DUP:
+                if depth == 0 or depth == stack_size:
+                    break
+                tos_1 = stack[-1]
+                stack.append(tos_1)
+                pc += 1
+                ticks += 4
+            elif kind == SWITCH:
+                if depth < 2:
+                    break
+                tos_1 = stack.pop()
+                tos_2 = stack.pop()
+                stack.append(tos_1)
+                stack.append(tos_2)
+                pc += 1
+                ticks += 5
+            elif kind == DROP:
+                if depth == 0:
+                    break
+                tos_1 = stack.pop()
+                pc += 1
+                ticks += 2
+            elif kind == JMP or (kind == JZ and z_flag == 0) or (kind == JNZ and z_flag == 1):
+                tos_1 = arg
+                pc = arg
+                ticks += 3
+            else:
+                pc += 1
+                ticks += 2
+            executed += 1
+            cell = current
+
+        if executed == 0:
+            self.bailouts += 1
+            return False
+
+        datapath.pc = pc
+        datapath.data_tos_reg_1, datapath.data_tos_reg_2, datapath.address_tos_reg_1 = tos_1, tos_2, address_tos
+        alu.z_flag = z_flag
+        if overflows:
+            alu.overflows += overflows
+        control_unit.ticks = ticks
+        control_unit.instructions = instructions + executed
+        control_unit.cur_instruction = cell.opcode
+        control_unit.cur_operand = cell.arg
+        self.entries += 1
+        self.fast_instructions += executed
+        return True
+
+    def discard(self, region: Region) -> None:
+        for addr in range(region.start, region.end + 1):
+            if self.regions.get(addr) is region:
+                del self.regions[addr]
+
+    def report(self) -> str:
+        return (
+            f"hot regions: {len({id(x) for x in self.regions.values()})}, entries: {self.entries}, "
+            f"fast-forwarded instructions: {self.fast_instructions}, bailouts: {self.bailouts}"
+        )
+
+
+def main(source_code_fn: str, input_data_fn: str, threshold: int = 2) -> None:
+    machine_code: list[MemoryCell] = read_code(source_code_fn)
+    input_str: list[int] = read_input(input_data_fn)
+
+    runner = HotLoopRunner(threshold)
+    print_output(simulation(machine_code, input_str, runner=runner.run))
+    print(runner.report())
+
+
+if __name__ == "__main__":
+    assert 4 >= len(sys.argv) >= 3, "Usage: hotloop.py <source_code_fn> <input_data_fn> <threshold> - optional"
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(funcName)s:%(message)s")
+    main(sys.argv[1], sys.argv[2], *[int(x) for x in sys.argv[3:]])
@@ -0,0 +1,121 @@
+import pytest
+from constants import INSTRUCTIONS_LIMIT
+from hotloop import HotLoopRunner
+from machine import simulation
+from metrics import MetricsCollector
+from program_loader import build_program, load_program
+
+COUNTER = """
+section .data:
+    count: 0
+section .text:
+    loop:
+        lit count
+        push
+        inc
+        lit count
+        pop
+        jmp loop
+"""
+
+SELF_MODIFYING = """
+section .data:
+    count: 3
+section .text:
+    loop:
+        lit count
+        push
+        lit 7
+        pop
+        jmp over
+        lit 99
+    over:
+        lit count
+        push
+        dec
+        dup
+        lit count
+        pop
+        lit 0
+        cmp
+        drop
+        drop
+        jnz loop
+        halt
+"""
+
+
+def final_state(code, input_data, runner):
+    states = []
+
+    def run(control_unit):
+        try:
+            runner(control_unit)
+        finally:
+            datapath = control_unit.datapath
+            states.append(
+                (
+                    datapath.pc,
+                    datapath.data_tos_reg_1,
+                    datapath.data_tos_reg_2,
+                    datapath.address_tos_reg_1,
+                    datapath.alu.z_flag,
+                    datapath.alu.overflows,
+                    list(datapath.data_stack),
+                    list(datapath.address_stack),
+                    [getattr(x, "arg", x) for x in datapath.memory],
+                    control_unit.cur_instruction,
+                )
+            )
+
+    return simulation(code, list(input_data), runner=run), states[0]
+
+
+def interpret(control_unit):
+    while control_unit.instructions < INSTRUCTIONS_LIMIT:
+        control_unit.decode_and_execute_instruction()
+
+
+@pytest.mark.parametrize(
+    ("source_fn", "input_data"),
+    [
+        ("examples/porb2.txt", []),
+        ("examples/hello_world.txt", []),
+        ("examples/cat.txt", [5, *map(ord, "hello")]),
+        ("examples/parallel_sum.txt", []),
+        ("examples/pure_calls.txt", []),
+    ],
+)
+def test_fast_forward_matches_interpreter(source_fn, input_data):
+    code = load_program(source_fn)
+    runner = HotLoopRunner()
+    assert final_state(code, input_data, runner.run) == final_state(code, input_data, interpret)
+
+
+def test_pure_loop_is_fast_forwarded():
+    code = load_program("examples/porb2.txt")
+    runner = HotLoopRunner()
+    _, instructions, _ = simulation(code, [], runner=runner.run)
+    assert runner.fast_instructions > 0.9 * instructions
+
+
+@pytest.mark.parametrize("threshold", [1, 2, 5])
+def test_instruction_limit(threshold):
+    code = build_program(COUNTER)
+    runner = HotLoopRunner(threshold)
+    result, state = final_state(code, [], runner.run)
+    assert result[1] == INSTRUCTIONS_LIMIT
+    assert (result, state) == final_state(code, [], interpret)
+
+
+def test_self_modifying_loop():
+    code = build_program(SELF_MODIFYING)
+    runner = HotLoopRunner(1)
+    assert final_state(code, [], runner.run) == final_state(code, [], interpret)
+
+
+def test_hooks_disable_fast_forward():
+    code = load_program("examples/porb2.txt")
+    runner = HotLoopRunner()
+    assert simulation(code, [], runner=runner.run, metrics=MetricsCollector()) == simulation(code, [])
+    assert runner.fast_instructions == 0
@@ -4,6 +4,7 @@ import json
 from enum import Enum
 
 import exception
+from constants import BYTE_SIZE, BYTES_PER_WORD, MAX_NUMBER, WORD_SIZE
 
 
 class Opcode(Enum):
@@ -29,6 +30,18 @@ class Opcode(Enum):
     DROP: str = "drop"
     IN: str = "in"
     OUT: str = "out"
+    INS: str = "ins"
+    OUTS: str = "outs"
+    INSB: str = "insb"
+    OUTSB: str = "outsb"
+    PUSHB: str = "pushb"
+    POPB: str = "popb"
+    EI: str = "ei"
+    DI: str = "di"
+    IRET: str = "iret"
+    COREID: str = "coreid"
+    SPAWN: str = "spawn"
+    XADD: str = "xadd"
 
     def __str__(self):
         return str(self.value)
@@ -41,6 +54,21 @@ def command2opcode(command: str) -> Opcode:
         raise exception.OpcodeError(command) from exception
 
 
+def pack_bytes(values: list[int]) -> list[int]:
+    words: list[int] = []
+    for i in range(0, len(values), BYTES_PER_WORD):
+        word = 0
+        for offset, value in enumerate(values[i : i + BYTES_PER_WORD]):
+            word |= value << (BYTE_SIZE * offset)
+        words.append(word - (1 << WORD_SIZE) if word > MAX_NUMBER else word)
+    return words
+
+
+def unpack_bytes(words: list[int], count: int) -> list[int]:
+    mask = (1 << BYTE_SIZE) - 1
+    return [(words[i // BYTES_PER_WORD] >> (BYTE_SIZE * (i % BYTES_PER_WORD))) & mask for i in range(count)]
+
+
 class Variable:
     def __init__(self, name: str, addr: int, value: str | int | None):
         self.name = name
@@ -87,8 +115,10 @@ def write_code(code: list[MachineWord | Variable], fn: str, custom_ser) -> None:
 
 def read_code(source: str) -> list[MemoryCell]:
     with open(source, encoding="utf-8") as f:
-        code = json.load(f)
+        return decode_code(json.load(f))
+
 
+def decode_code(code: list[dict]) -> list[MemoryCell]:
     program: list[MemoryCell] = []
     for i in code:
         if "opcode" in i and "arg" in i and i["arg"] is not None:
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from constants import INTERRUPT_VECTOR_NAME
+from exception import DuplicateSymbolError, LabelNotDefinedError, VariableOrLabelNotDefinedError
+from isa import MachineWord, Opcode, Variable, write_code
+from translator import (
+    Program,
+    clean_code_lines,
+    custom_serializer,
+    get_variable_addr,
+    is_indirect,
+    is_malloc_request,
+    is_variable,
+    translate_section_data,
+    translate_section_text,
+)
+
+OBJECT_FORMAT_VERSION = 2
+START_ADDRESS = 1
+
+
+@dataclass
+class ObjectModule:
+    digest: str
+    words: list[dict] = field(default_factory=list)
+    symbols: dict[str, int] = field(default_factory=dict)
+    labels: list[str] = field(default_factory=list)
+    globals: list[str] = field(default_factory=list)
+    externs: list[str] = field(default_factory=list)
+    includes: list[str] = field(default_factory=list)
+    local_relocations: list[int] = field(default_factory=list)
+    extern_relocations: list[tuple[int, str]] = field(default_factory=list)
+    lines: list[tuple[int, int, str]] = field(default_factory=list)
+    entry: int | None = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), indent=1)
+
+    @staticmethod
+    def from_json(data: str) -> ObjectModule:
+        module = ObjectModule(**json.loads(data))
+        module.extern_relocations = [(offset, name) for offset, name in module.extern_relocations]
+        module.lines = [(offset, line, text) for offset, line, text in module.lines]
+        return module
+
+
+@dataclass
+class LinkedProgram:
+    machine_code: list[MachineWord | Variable]
+    source_map: dict
+    modules: list[str]
+    translated: list[str]
+    cached: list[str]
+
+
+def is_include(s: str) -> bool:
+    return bool(re.match(r'^include\s+"[^"]+"$', s))
+
+
+def is_symbol_directive(s: str) -> bool:
+    return bool(re.match(r"^(global|extern)\s+[a-zA-Z_][a-zA-Z0-9_]*(\s*,\s*[a-zA-Z_][a-zA-Z0-9_]*)*$", s))
+
+
+def module_digest(src_code: str) -> str:
+    return hashlib.sha256(f"{OBJECT_FORMAT_VERSION}\0{src_code}".encode()).hexdigest()
+
+
+def section_block(numbered_code: list[tuple[int, str]], name: str, end_name: str) -> list[tuple[int, str]]:
+    starts = [i for i, (_, x) in enumerate(numbered_code) if x == name]
+    assert len(starts) <= 1, f"Translation error: {name} is in multiple places"
+    if not starts:
+        return []
+    ends = [i for i, (_, x) in enumerate(numbered_code) if x == end_name and i > starts[0]]
+    return numbered_code[starts[0] + 1 : ends[0] if ends else len(numbered_code)]
+
+
+def data_references(data_block: list[str]) -> set[str]:
+    references: set[str] = set()
+    for data in data_block:
+        var_name, var_value = (x.strip() for x in data.split(":", 1))
+        if not is_malloc_request(var_value) and is_variable(var_value):
+            references.add(var_name)
+    return references
+
+
+def compile_module(src_code: str) -> ObjectModule:
+    module = ObjectModule(module_digest(src_code))
+    numbered_code: list[tuple[int, str]] = []
+    for number, line in clean_code_lines(src_code):
+        if is_include(line):
+            module.includes.append(line.split('"')[1])
+        elif is_symbol_directive(line):
+            kind, names = line.split(None, 1)
+            target = module.globals if kind == "global" else module.externs
+            target.extend(x.strip() for x in names.split(","))
+        else:
+            numbered_code.append((number, line))
+
+    data_block = [x for _, x in section_block(numbered_code, "section .data:", "section .text:")]
+    text_block = section_block(numbered_code, "section .text:", "section .data:")
+
+    program = Program()
+    translate_section_data(data_block, program, start_address=False)
+    translate_section_text([x for _, x in text_block], program, [number for number, _ in text_block])
+    relocate_module(module, program, data_references(data_block))
+
+    for name in module.globals:
+        if name not in module.symbols:
+            raise LabelNotDefinedError(name)
+    module.lines = [(offset, line, text) for offset, (line, text) in sorted(program.lines.items())]
+    return module
+
+
+def relocate_module(module: ObjectModule, program: Program, references: set[str]) -> None:
+    module.symbols = {name: var.addr for name, var in program.variables.items()}
+    module.symbols.update(program.labels)
+    module.labels = list(program.labels)
+
+    for word in program.machine_code:
+        if isinstance(word, Variable):
+            value = word.value
+            if word.name in references and word.addr == program.variables[word.name].addr:
+                if isinstance(value, str):
+                    value = program.labels.get(value)
+                    if value is None:
+                        raise LabelNotDefinedError(word.value)
+                module.local_relocations.append(word.addr)
+            module.words.append({"name": word.name, "value": value})
+            continue
+
+        if module.entry is None:
+            module.entry = word.index
+        arg = word.arg
+        if isinstance(arg, str):
+            if arg in program.labels:
+                arg = program.labels[arg]
+                module.local_relocations.append(word.index)
+            elif arg in program.variables:
+                arg = program.variables[arg].addr
+                module.local_relocations.append(word.index)
+            elif is_indirect(arg) and arg[1:-1] in program.variables:
+                indirect_variable = get_variable_addr(program.variables[arg[1:-1]], program)
+                assert indirect_variable is not None, f"Variable {arg[1:-1]} is not defined to be referenced"
+                arg = indirect_variable.value
+                if indirect_variable.name in references:
+                    module.local_relocations.append(word.index)
+            elif arg in module.externs:
+                module.extern_relocations.append((word.index, arg))
+                arg = 0
+            else:
+                raise VariableOrLabelNotDefinedError(arg)
+        module.words.append({"opcode": word.opcode.value, "arg": arg})
+
+
+def load_module(source_fn: str, cache_dir: str | None) -> tuple[ObjectModule, bool]:
+    with open(source_fn, encoding="utf-8") as f:
+        src_code = f.read()
+    digest = module_digest(src_code)
+    cache_fn = None if cache_dir is None else Path(cache_dir) / f"{digest}.json"
+    if cache_fn is not None and cache_fn.exists():
+        with open(cache_fn, encoding="utf-8") as f:
+            return ObjectModule.from_json(f.read()), True
+
+    module = compile_module(src_code)
+    if cache_fn is not None:
+        cache_fn.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_fn, "w", encoding="utf-8") as f:
+            f.write(module.to_json())
+    return module, False
+
+
+def link(modules: list[tuple[str, ObjectModule]]) -> tuple[list[MachineWord | Variable], dict]:
+    bases: list[int] = []
+    addr = START_ADDRESS
+    for _, module in modules:
+        bases.append(addr)
+        addr += len(module.words)
+
+    symbols: dict[str, int] = {}
+    for (name, module), base in zip(modules, bases):
+        if name != modules[0][0] and INTERRUPT_VECTOR_NAME in module.symbols:
+            raise DuplicateSymbolError(INTERRUPT_VECTOR_NAME)
+        for symbol in module.globals:
+            if symbol in symbols:
+                raise DuplicateSymbolError(symbol)
+            symbols[symbol] = base + module.symbols[symbol]
+
+    main = modules[0][1]
+    assert INTERRUPT_VECTOR_NAME in main.symbols or not any(
+        word.get("opcode") == Opcode.EI.value for _, module in modules for word in module.words
+    ), f"Instruction ei requires variable {INTERRUPT_VECTOR_NAME} in section .data of {modules[0][0]}"
+    entry = None if main.entry is None else bases[0] + main.entry
+    machine_code: list[MachineWord | Variable] = [Variable("start_address", 0, entry)]
+    source_map: dict = {"instructions": [], "labels": {}, "variables": {}}
+    for (name, module), base in zip(modules, bases):
+        values = [word.get("arg", word.get("value")) for word in module.words]
+        for offset in module.local_relocations:
+            values[offset] += base
+        for offset, symbol in module.extern_relocations:
+            if symbol not in symbols:
+                raise VariableOrLabelNotDefinedError(symbol)
+            values[offset] = symbols[symbol]
+        for offset, (word, value) in enumerate(zip(module.words, values)):
+            if "opcode" in word:
+                machine_code.append(MachineWord(base + offset, Opcode(word["opcode"]), value))
+            else:
+                machine_code.append(Variable(word["name"], base + offset, value))
+
+        prefix = "" if name == modules[0][0] else f"{name}:"
+        for offset, line, text in module.lines:
+            source_map["instructions"].append({"addr": base + offset, "line": line, "text": text, "file": name})
+        for symbol, offset in module.symbols.items():
+            kind = "labels" if symbol in module.labels else "variables"
+            qualified = symbol if symbol in module.globals else prefix + symbol
+            source_map[kind][qualified] = base + offset
+    return machine_code, source_map
+
+
+def build(main_fn: str, cache_dir: str | None = None) -> LinkedProgram:
+    modules: list[tuple[str, ObjectModule]] = []
+    translated: list[str] = []
+    cached: list[str] = []
+    seen: set[str] = set()
+    pending: list[str] = [os.path.normpath(main_fn)]
+    while pending:
+        source_fn = pending.pop(0)
+        if source_fn in seen:
+            continue
+        seen.add(source_fn)
+        module, from_cache = load_module(source_fn, cache_dir)
+        (cached if from_cache else translated).append(source_fn)
+        modules.append((source_fn, module))
+        pending.extend(os.path.normpath(Path(source_fn).parent / x) for x in module.includes)
+
+    machine_code, source_map = link(modules)
+    return LinkedProgram(machine_code, source_map, [name for name, _ in modules], translated, cached)
+
+
+def main(source: str, target: str, cache_dir: str | None = None) -> None:
+    program = build(source, cache_dir)
+    write_code(program.machine_code, target, custom_serializer)
+    print(
+        f"modules: {len(program.modules)} translated: {len(program.translated)} cached: {len(program.cached)} "
+        f"code instr: {len(program.machine_code)}"
+    )
+
+
+if __name__ == "__main__":
+    assert 4 >= len(sys.argv) >= 3, "Usage: linker.py <main_source_file> <target_file> <cache_dir> - optional"
+    main(*sys.argv[1:])
@@ -0,0 +1,99 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from exception import DuplicateSymbolError, VariableOrLabelNotDefinedError
+from isa import read_code, write_code
+from linker import build
+from machine import simulation
+from translator import custom_serializer, translate
+
+SINGLE_FILE_EXAMPLES = [str(fn) for fn in sorted(Path("examples").glob("*.txt")) if fn.name != "hello_modules.txt"]
+
+
+def serialize(code, fn):
+    write_code(code, fn, custom_serializer)
+    with open(fn, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("source_fn", SINGLE_FILE_EXAMPLES)
+def test_single_module_matches_translator(source_fn, tmp_path):
+    with open(source_fn, encoding="utf-8") as f:
+        expected = translate(f.read())[0]
+    linked = build(source_fn).machine_code
+    assert serialize(linked, tmp_path / "linked.json") == serialize(expected, tmp_path / "expected.json")
+
+
+def test_hello_modules(tmp_path):
+    program = build("examples/hello_modules.txt")
+    target = tmp_path / "hello_modules.json"
+    serialize(program.machine_code, target)
+    output = simulation(read_code(target), [])[0]
+
+    assert "".join(map(chr, output)) == "Hello from modules!\nlinker"
+    assert program.modules == ["examples/hello_modules.txt", os.path.normpath("examples/lib/strings.txt")]
+    assert "print_str" in program.source_map["labels"]
+    assert os.path.normpath("examples/lib/strings.txt") + ":print_loop" in program.source_map["labels"]
+
+
+def test_object_cache(tmp_path):
+    sources = tmp_path / "src"
+    shutil.copytree("examples", sources)
+    cache_dir = tmp_path / "cache"
+    main_fn = str(sources / "hello_modules.txt")
+    lib_fn = os.path.normpath(sources / "lib" / "strings.txt")
+
+    first = build(main_fn, str(cache_dir))
+    assert len(first.translated) == 2
+    assert first.cached == []
+
+    second = build(main_fn, str(cache_dir))
+    assert second.translated == []
+    assert len(second.cached) == 2
+    assert serialize(second.machine_code, tmp_path / "a.json") == serialize(first.machine_code, tmp_path / "b.json")
+
+    with open(lib_fn, "a", encoding="utf-8") as f:
+        f.write("\n; changed\n")
+    third = build(main_fn, str(cache_dir))
+    assert third.translated == [lib_fn]
+    assert third.cached == [os.path.normpath(main_fn)]
+
+
+def write_module(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_link_errors(tmp_path):
+    write_module(tmp_path / "a.txt", "global f\nsection .text:\n f:\n ret\n")
+    write_module(tmp_path / "b.txt", "global f\nsection .text:\n f:\n ret\n")
+    main_fn = write_module(
+        tmp_path / "main.txt", 'include "a.txt"\ninclude "b.txt"\nextern f\nsection .text:\n call f\n halt\n'
+    )
+    with pytest.raises(DuplicateSymbolError):
+        build(main_fn)
+
+    main_fn = write_module(tmp_path / "main.txt", "extern g\nsection .text:\n call g\n halt\n")
+    with pytest.raises(VariableOrLabelNotDefinedError):
+        build(main_fn)
+
+
+def test_trailing_label(tmp_path):
+    write_module(tmp_path / "lib.txt", "global tail\nsection .data:\n x: 1\nsection .text:\n lit x\n tail:\n")
+    main_fn = write_module(tmp_path / "main.txt", 'include "lib.txt"\nsection .text:\n halt\n end:\n')
+    program = build(main_fn)
+    lib_fn = os.path.normpath(tmp_path / "lib.txt")
+
+    assert program.source_map["labels"] == {"end": 2, "tail": 4}
+    assert program.source_map["variables"] == {f"{lib_fn}:x": 2}
+
+
+def test_ei_requires_interrupt_vector(tmp_path):
+    write_module(tmp_path / "lib.txt", "global enable\nsection .text:\n enable:\n ei\n ret\n")
+    main_fn = write_module(
+        tmp_path / "main.txt", 'include "lib.txt"\nextern enable\nsection .text:\n call enable\n halt\n'
+    )
+    with pytest.raises(AssertionError, match="requires variable int_vector"):
+        build(main_fn)
@@ -1,63 +1,71 @@
 from __future__ import annotations
 
 import logging
+import operator
 import sys
 import unicodedata
 from dataclasses import dataclass
-from typing import Callable
-
-from constants import ADDRESS_STACK_SIZE, DATA_STACK_SIZE, INSTRUCTIONS_LIMIT, MAX_NUMBER, MEMORY_SIZE, MIN_NUMBER
+from typing import TYPE_CHECKING, Callable
+
+from constants import (
+    ADDRESS_STACK_SIZE,
+    BYTE_SIZE,
+    BYTES_PER_WORD,
+    DATA_STACK_SIZE,
+    INSTRUCTIONS_LIMIT,
+    INTERRUPT_VECTOR_ADDRESS,
+    MAX_NUMBER,
+    MEMORY_SIZE,
+    MIN_NUMBER,
+    WORD_MASK,
+)
 from exception import HaltProgramError
-from isa import MemoryCell, Opcode, read_code
-
-AVAILABLE_ALU_BIN_OPERATIONS: dict[Opcode, Callable] = {
-    Opcode.ADD: lambda x, y: int(x + y),
-    Opcode.SUB: lambda x, y: int(x - y),
-    Opcode.MUL: lambda x, y: int(x * y),
-    Opcode.DIV: lambda x, y: int(x / y),
-    Opcode.MOD: lambda x, y: int(x % y),
-    Opcode.CMP: lambda x, y: int(x - y),
-}
+from isa import MemoryCell, Opcode, pack_bytes, read_code, unpack_bytes
+
+if TYPE_CHECKING:
+    from memoization import CallCache
+    from metrics import MetricsCollector
+
+
+def wrap_word(value: int) -> int:
+    return ((value - MIN_NUMBER) & WORD_MASK) + MIN_NUMBER
+
+
+def truncating_div(left: int, right: int) -> int:
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
 
-AVAILABLE_ALU_UNARY_OPERATIONS: dict[Opcode, Callable] = {
-    Opcode.INC: lambda x: int(x + 1),
-    Opcode.DEC: lambda x: int(x - 1),
+def truncating_mod(left: int, right: int) -> int:
+    return left - right * truncating_div(left, right)
+
+
+ALU_OPERATIONS: dict[Opcode, Callable[[int, int], int]] = {
+    Opcode.ADD: operator.add,
+    Opcode.SUB: operator.sub,
+    Opcode.MUL: operator.mul,
+    Opcode.DIV: truncating_div,
+    Opcode.MOD: truncating_mod,
+    Opcode.CMP: operator.sub,
+    Opcode.INC: lambda x, _: x + 1,
+    Opcode.DEC: lambda x, _: x - 1,
 }
 
 
 class Alu:
     z_flag = 0
 
-    def calculate(self, left: int, right: int, opcode: Opcode) -> int | None:
-        assert opcode in AVAILABLE_ALU_BIN_OPERATIONS or opcode in AVAILABLE_ALU_UNARY_OPERATIONS, (
-            f"Unknown alu " f"operation code:" f" {opcode}"
-        )
-        if opcode in AVAILABLE_ALU_BIN_OPERATIONS:
-            alu_op_handler = AVAILABLE_ALU_BIN_OPERATIONS[opcode]
-            calculated_value = alu_op_handler(left, right)
-            calculated_value = self.overflow(calculated_value)
-            self.set_flags(calculated_value)
-            return calculated_value
-        if opcode in AVAILABLE_ALU_UNARY_OPERATIONS:
-            alu_op_handler = AVAILABLE_ALU_UNARY_OPERATIONS[opcode]
-            calculated_value = alu_op_handler(left)
-            calculated_value = self.overflow(calculated_value)
-            self.set_flags(calculated_value)
-            return calculated_value
-        return None
-
-    def overflow(self, value: int) -> int:
-        if value > MAX_NUMBER:
-            return value % MAX_NUMBER
-        if value < MIN_NUMBER:
-            return value % abs(MIN_NUMBER)
-        return value
+    overflows = 0
 
-    def set_flags(self, value: int):
-        if value == 0:
-            self.z_flag = 0
-        else:
-            self.z_flag = 1
+    def calculate(self, left: int, right: int, opcode: Opcode) -> int:
+        operation = ALU_OPERATIONS.get(opcode)
+        assert operation is not None, f"Unknown alu " f"operation code:" f" {opcode}"
+        value = operation(left, right)
+        if value > MAX_NUMBER or value < MIN_NUMBER:
+            self.overflows += 1
+            value = wrap_word(value)
+        self.z_flag = 0 if value == 0 else 1
+        return value
 
 
 @dataclass(frozen=True)
@@ -70,14 +78,31 @@ STDOUT: Port = Port(1)
 
 
 class IO:
-    def __init__(self, ports: dict[Port, list[int]]):
+    def __init__(self, ports: dict[Port, list[int]], schedule: list[tuple[int, Port, int]] | None = None):
         self.ports: dict[Port, list[int]] = ports
+        self.schedule: list[tuple[int, Port, int]] | None = schedule
+
+    def deliver(self, tick: int) -> None:
+        while self.schedule and self.schedule[0][0] <= tick:
+            _, port, value = self.schedule.pop(0)
+            self.ports[port].append(value)
+
+    def next_arrival(self) -> int | None:
+        if not self.schedule:
+            return None
+        return self.schedule[0][0]
+
+    def is_ready(self, port: Port) -> bool:
+        return len(self.ports[port]) > 0
+
+    def pending(self, port: Port) -> int:
+        return len(self.ports[port])
 
     def read(self, port: Port):
         assert port in self.ports, f"Undefined port {port}"
         value = self.ports[port].pop(0)
 
-        if unicodedata.category(chr(value)) in [
+        if not 0 <= value < sys.maxunicode + 1 or unicodedata.category(chr(value)) in [
             "Cc",
             "Cf",
             "Cs",
@@ -104,6 +129,26 @@ class IO:
         except ValueError:
             logging.debug(" OUT: %s\n", self.ports[STDOUT])
 
+    def read_block(self, port: Port, count: int) -> list[int]:
+        assert port in self.ports, f"Undefined port {port}"
+        assert len(self.ports[port]) >= count, f"Not enough input on port {port.value}"
+        values = self.ports[port][:count]
+        del self.ports[port][:count]
+        logging.debug("INS: %s\n", values)
+        return values
+
+    def write_block(self, port: Port, values: list[int]) -> None:
+        assert port in self.ports, f"Undefined port {port.value}"
+        self.ports[port].extend(values)
+        try:
+            logging.debug(
+                " OUTS: %s << %s\n",
+                "".join([chr(x) for x in self.ports[STDOUT]]),
+                "".join([chr(x) for x in values]),
+            )
+        except ValueError:
+            logging.debug(" OUTS: %s\n", self.ports[STDOUT])
+
 
 class DataPath:
     alu: Alu = None
@@ -158,6 +203,18 @@ class DataPath:
         assert addr < self.mem_size, f"Memory write fault, cell with address - {addr} does not exist"
         self.memory[addr] = MemoryCell(addr, None, value)
 
+    def holds_instruction(self, addr: int | None) -> bool:
+        return (
+            isinstance(addr, int)
+            and 0 <= addr < self.mem_size
+            and isinstance(self.memory[addr], MemoryCell)
+            and self.memory[addr].opcode is not None
+        )
+
+    def check_mem_block(self, addr: int, size: int) -> None:
+        assert addr >= 0, f"Memory write fault, cell with address - {addr} does not exist"
+        assert addr + size <= self.mem_size, f"Memory write fault, cell with address - {addr + size - 1} does not exist"
+
     def signal_latch_data_stack_reg_1(self, value: int) -> None:
         self.data_tos_reg_1 = value
 
@@ -184,6 +241,34 @@ class DataPath:
         self.address_stack.append(value)
 
 
+def format_state(
+    ticks: int,
+    pc: int,
+    data_tos_reg_1: int,
+    data_tos_reg_2: int,
+    address_tos_reg_1: int,
+    z_flag: int,
+    data_stack: list[int],
+    address_stack: list[int],
+    instruction: Opcode | None,
+    operand: int | None,
+) -> str:
+    state_repr = (
+        f" TICK: {ticks!s:3} PC {pc!s:3} TODS1 {data_tos_reg_1!s:3} "
+        f"TODS2 {data_tos_reg_2!s:3} TOAS {address_tos_reg_1!s:3} "
+        f"Z_FLAG {z_flag!s:3}"
+    )
+
+    data_stack_repr = f"DATA_STACK {data_stack}"
+    address_stack_repr = f"ADDRESS_STACK {address_stack}"
+
+    cur_command = f"{instruction} {operand}"
+
+    if operand is None:
+        return f"{state_repr} {instruction}\n       {data_stack_repr}\n       {address_stack_repr} \n"
+    return f"{state_repr} {cur_command}\n       {data_stack_repr}\n       {address_stack_repr} \n"
+
+
 class ControlUnit:
     datapath: DataPath = None
 
@@ -195,9 +280,24 @@ class ControlUnit:
 
     executors: dict[Opcode, Callable] = None
 
-    def __init__(self, datapath: DataPath):
+    interrupts_enabled: bool = False
+
+    instructions: int = None
+
+    call_cache: CallCache | None = None
+
+    core_id: int = 0
+
+    spawner: Callable[[ControlUnit, int, int], int] | None = None
+
+    def __init__(self, datapath: DataPath, call_cache: CallCache | None = None, core_id: int = 0):
         self.datapath = datapath
         self.ticks = 0
+        self.instructions = 0
+        self.interrupts_enabled = False
+        self.call_cache = call_cache
+        self.core_id = core_id
+        self.spawner = None
 
         self.executors = {
             Opcode.LIT: self.execute_lit,
@@ -216,6 +316,17 @@ class ControlUnit:
             Opcode.DROP: self.execute_drop,
             Opcode.OUT: self.execute_out,
             Opcode.IN: self.execute_in,
+            Opcode.OUTS: self.execute_outs,
+            Opcode.INS: self.execute_ins,
+            Opcode.OUTSB: self.execute_outsb,
+            Opcode.INSB: self.execute_insb,
+            Opcode.PUSHB: self.execute_pushb,
+            Opcode.POPB: self.execute_popb,
+            Opcode.EI: self.execute_ei,
+            Opcode.DI: self.execute_di,
+            Opcode.COREID: self.execute_coreid,
+            Opcode.SPAWN: self.execute_spawn,
+            Opcode.XADD: self.execute_xadd,
         }
 
     def tick(self):
@@ -229,13 +340,55 @@ class ControlUnit:
         self.datapath.signal_latch_pc(self.datapath.data_tos_reg_1)
         self.tick()
 
+    def check_interrupt(self):
+        if self.datapath.io.schedule:
+            self.datapath.io.deliver(self.ticks)
+        if self.interrupts_enabled and self.datapath.io.is_ready(STDIN):
+            self.enter_interrupt()
+
+    def enter_interrupt(self):
+        self.interrupts_enabled = False
+        self.datapath.signal_latch_top_address_stack(self.datapath.pc)
+        self.datapath.signal_write_top_address_stack(self.datapath.address_tos_reg_1)
+        self.tick()
+
+        self.datapath.signal_latch_top_address_stack(self.datapath.alu.z_flag)
+        self.datapath.signal_write_top_address_stack(self.datapath.address_tos_reg_1)
+        self.tick()
+
+        vector = self.datapath.signal_read_mem(INTERRUPT_VECTOR_ADDRESS)
+        assert isinstance(vector, MemoryCell), f"Cell {INTERRUPT_VECTOR_ADDRESS} does not hold an interrupt vector"
+        assert vector.opcode is None, f"Cell {INTERRUPT_VECTOR_ADDRESS} does not hold an interrupt vector"
+        assert self.datapath.holds_instruction(vector.arg), (
+            f"Cell {INTERRUPT_VECTOR_ADDRESS} does not hold an interrupt vector"
+        )
+        self.datapath.signal_latch_pc(vector.arg)
+        self.tick()
+
+        if self.call_cache is not None:
+            self.call_cache.abort()
+
+        logging.debug("%s", self.__repr__())
+
+    def wait_for_input(self, port: Port, count: int = 1):
+        while self.datapath.io.pending(port) < count and self.datapath.io.next_arrival() is not None:
+            self.ticks = max(self.ticks, self.datapath.io.next_arrival())
+            self.datapath.io.deliver(self.ticks)
+
     def decode_and_execute_instruction(self):
+        if self.interrupts_enabled or self.datapath.io.schedule:
+            self.check_interrupt()
+
         instruction = self.datapath.signal_read_mem(self.datapath.pc)
+        self.instructions += 1
         self.tick()
 
         self.cur_instruction = instruction.opcode
         self.cur_operand = instruction.arg
 
+        if self.call_cache is not None and self.call_cache.frames:
+            self.call_cache.observe(self, self.cur_instruction)
+
         if self.decode_and_execute_control_flow_instruction(self.cur_instruction):
             return
 
@@ -261,6 +414,9 @@ class ControlUnit:
         if opcode == Opcode.RET:
             self.execute_ret()
             return True
+        if opcode == Opcode.IRET:
+            self.execute_iret()
+            return True
         return False
 
     def execute_lit(self, opcode: Opcode):
@@ -302,6 +458,8 @@ class ControlUnit:
         self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
         self.tick()
 
+        self.wait_for_input(Port(self.datapath.data_tos_reg_1))
+
         self.datapath.signal_latch_data_stack_reg_1(self.datapath.io.read(Port(self.datapath.data_tos_reg_1)))
         self.tick()
 
@@ -309,6 +467,156 @@ class ControlUnit:
         self.datapath.signal_latch_pc(self.datapath.pc + 1)
         self.tick()
 
+    def execute_outs(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
+        self.tick()
+
+        self.datapath.signal_latch_top_address_stack(self.datapath.signal_read_data_stack())
+        self.tick()
+
+        self.datapath.signal_latch_data_stack_reg_2(self.datapath.signal_read_mem(self.datapath.address_tos_reg_1).arg)
+        self.tick()
+
+        start = self.datapath.address_tos_reg_1 + 1
+        values: list[int] = []
+        for addr in range(start, start + self.datapath.data_tos_reg_2):
+            values.append(self.datapath.signal_read_mem(addr).arg)
+            self.tick()
+            self.tick()
+
+        self.datapath.io.write_block(Port(self.datapath.data_tos_reg_1), values)
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_ins(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
+        self.tick()
+
+        port = Port(self.datapath.data_tos_reg_1)
+        self.datapath.signal_latch_top_address_stack(self.datapath.signal_read_data_stack())
+        self.wait_for_input(port)
+        self.datapath.signal_latch_data_stack_reg_2(self.datapath.io.read(port))
+        self.tick()
+
+        assert self.datapath.data_tos_reg_2 >= 0, f"Negative block length: {self.datapath.data_tos_reg_2}"
+        self.datapath.check_mem_block(self.datapath.address_tos_reg_1, 1 + self.datapath.data_tos_reg_2)
+        self.datapath.signal_write_mem(self.datapath.address_tos_reg_1, self.datapath.data_tos_reg_2)
+        self.tick()
+
+        self.wait_for_input(port, self.datapath.data_tos_reg_2)
+        values = self.datapath.io.read_block(port, self.datapath.data_tos_reg_2)
+        for offset, value in enumerate(values, start=1):
+            self.datapath.signal_write_mem(self.datapath.address_tos_reg_1 + offset, value)
+            self.tick()
+            self.tick()
+
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_outsb(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
+        self.tick()
+
+        self.datapath.signal_latch_top_address_stack(self.datapath.signal_read_data_stack())
+        self.tick()
+
+        self.datapath.signal_latch_data_stack_reg_2(self.datapath.signal_read_mem(self.datapath.address_tos_reg_1).arg)
+        self.tick()
+
+        start = self.datapath.address_tos_reg_1 + 1
+        words: list[int] = []
+        for addr in range(start, start + -(-self.datapath.data_tos_reg_2 // BYTES_PER_WORD)):
+            words.append(self.datapath.signal_read_mem(addr).arg)
+            self.tick()
+
+        values = unpack_bytes(words, self.datapath.data_tos_reg_2)
+        for _ in values:
+            self.tick()
+        self.datapath.io.write_block(Port(self.datapath.data_tos_reg_1), values)
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_insb(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
+        self.tick()
+
+        port = Port(self.datapath.data_tos_reg_1)
+        self.datapath.signal_latch_top_address_stack(self.datapath.signal_read_data_stack())
+        self.wait_for_input(port)
+        self.datapath.signal_latch_data_stack_reg_2(self.datapath.io.read(port))
+        self.tick()
+
+        assert self.datapath.data_tos_reg_2 >= 0, f"Negative block length: {self.datapath.data_tos_reg_2}"
+        self.datapath.check_mem_block(
+            self.datapath.address_tos_reg_1, 1 + -(-self.datapath.data_tos_reg_2 // BYTES_PER_WORD)
+        )
+        self.datapath.signal_write_mem(self.datapath.address_tos_reg_1, self.datapath.data_tos_reg_2)
+        self.tick()
+
+        self.wait_for_input(port, self.datapath.data_tos_reg_2)
+        values = self.datapath.io.read_block(port, self.datapath.data_tos_reg_2)
+        assert all(0 <= x < 2**BYTE_SIZE for x in values), f"Packed input contains non 8-bit characters: {values}"
+        for _ in values:
+            self.tick()
+        for offset, word in enumerate(pack_bytes(values), start=1):
+            self.datapath.signal_write_mem(self.datapath.address_tos_reg_1 + offset, word)
+            self.tick()
+
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_pushb(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_data_stack())
+        self.datapath.signal_latch_top_address_stack(self.datapath.pc)
+        self.tick()
+
+        self.datapath.signal_latch_data_stack_reg_2(BYTE_SIZE * (self.datapath.data_tos_reg_1 % BYTES_PER_WORD))
+        self.datapath.signal_latch_pc(self.datapath.data_tos_reg_1 // BYTES_PER_WORD)
+        self.tick()
+
+        word = self.datapath.signal_read_mem(self.datapath.pc).arg
+        self.datapath.signal_latch_data_stack_reg_1((word >> self.datapath.data_tos_reg_2) & ((1 << BYTE_SIZE) - 1))
+        self.tick()
+
+        self.datapath.signal_write_data_stack(self.datapath.data_tos_reg_1)
+        self.datapath.signal_latch_pc(self.datapath.address_tos_reg_1)
+        self.tick()
+
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+        self.tick()
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_popb(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_data_stack())
+        self.tick()
+
+        self.datapath.signal_latch_data_stack_reg_2(self.datapath.signal_read_data_stack())
+        self.datapath.signal_latch_top_address_stack(self.datapath.pc)
+        self.tick()
+
+        shift = BYTE_SIZE * (self.datapath.data_tos_reg_1 % BYTES_PER_WORD)
+        self.datapath.signal_latch_pc(self.datapath.data_tos_reg_1 // BYTES_PER_WORD)
+        self.tick()
+
+        mask = ((1 << BYTE_SIZE) - 1) << shift
+        word = self.datapath.signal_read_mem(self.datapath.pc).arg
+        self.tick()
+
+        self.datapath.signal_write_mem(
+            self.datapath.pc, wrap_word((word & ~mask) | ((self.datapath.data_tos_reg_2 << shift) & mask))
+        )
+        self.tick()
+
+        self.datapath.signal_latch_pc(self.datapath.address_tos_reg_1 + 1)
+        self.tick()
+
+        logging.debug("%s", self.__repr__())
+
     def execute_push(self, opcode: Opcode):
         self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_data_stack())
         self.datapath.signal_latch_top_address_stack(self.datapath.pc)
@@ -346,7 +654,7 @@ class ControlUnit:
         self.datapath.signal_latch_pc(self.datapath.address_tos_reg_1 + 1)
         self.tick()
 
-        logging.debug(self.__repr__())
+        logging.debug("%s", self.__repr__())
 
     def execute_dup(self, opcode: Opcode):
         self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_data_stack())
@@ -458,6 +766,10 @@ class ControlUnit:
         logging.debug("%s", self.__repr__())
 
     def execute_call(self):
+        if self.call_cache is not None and self.call_cache.apply(self):
+            logging.debug("%s", self.__repr__())
+            return
+
         self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
         self.tick()
 
@@ -478,23 +790,99 @@ class ControlUnit:
         self.datapath.signal_latch_pc(self.datapath.address_tos_reg_1)
         self.tick()
 
+        if self.call_cache is not None and self.call_cache.frames:
+            self.call_cache.complete(self)
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_ei(self, opcode: Opcode):
+        self.interrupts_enabled = True
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+        self.tick()
+
         logging.debug("%s", self.__repr__())
 
-    def __repr__(self):
-        state_repr = (
-            f" TICK: {self.ticks!s:3} PC {self.datapath.pc!s:3} TODS1 {self.datapath.data_tos_reg_1!s:3} "
-            f"TODS2 {self.datapath.data_tos_reg_2!s:3} TOAS {self.datapath.address_tos_reg_1!s:3} "
-            f"Z_FLAG {self.datapath.alu.z_flag!s:3}"
-        )
+    def execute_di(self, opcode: Opcode):
+        self.interrupts_enabled = False
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+        self.tick()
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_iret(self):
+        self.datapath.signal_latch_top_address_stack(self.datapath.signal_read_top_of_address_stack())
+        self.datapath.alu.z_flag = self.datapath.address_tos_reg_1
+        self.tick()
 
-        data_stack_repr = f"DATA_STACK {self.datapath.data_stack}"
-        address_stack_repr = f"ADDRESS_STACK {self.datapath.address_stack}"
+        self.datapath.signal_latch_top_address_stack(self.datapath.signal_read_top_of_address_stack())
+        self.datapath.signal_latch_pc(self.datapath.address_tos_reg_1)
+        self.interrupts_enabled = True
+        self.tick()
 
-        cur_command = f"{self.cur_instruction} {self.cur_operand}"
+        logging.debug("%s", self.__repr__())
 
-        if self.cur_operand is None:
-            return f"{state_repr} {self.cur_instruction}\n       {data_stack_repr}\n       {address_stack_repr} \n"
-        return f"{state_repr} {cur_command}\n       {data_stack_repr}\n       {address_stack_repr} \n"
+    def execute_coreid(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.core_id)
+        self.tick()
+
+        self.datapath.signal_write_data_stack(self.datapath.data_tos_reg_1)
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+        self.tick()
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_spawn(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
+        self.tick()
+
+        self.datapath.signal_latch_data_stack_reg_2(self.datapath.signal_read_data_stack())
+        self.tick()
+
+        core = -1
+        if self.spawner is not None:
+            core = self.spawner(self, self.datapath.data_tos_reg_1, self.datapath.data_tos_reg_2)
+        self.datapath.signal_latch_data_stack_reg_1(core)
+        self.datapath.signal_write_data_stack(self.datapath.data_tos_reg_1)
+        self.datapath.signal_latch_pc(self.datapath.pc + 1)
+        self.tick()
+
+        logging.debug("%s", self.__repr__())
+
+    def execute_xadd(self, opcode: Opcode):
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_data_stack())
+        self.datapath.signal_latch_top_address_stack(self.datapath.pc)
+        self.tick()
+
+        self.datapath.signal_latch_data_stack_reg_2(self.datapath.signal_read_data_stack())
+        self.datapath.signal_latch_pc(self.datapath.data_tos_reg_1)
+        self.tick()
+
+        self.datapath.signal_latch_data_stack_reg_1(self.datapath.signal_read_mem(self.datapath.pc).arg)
+        self.tick()
+
+        res = self.datapath.alu.calculate(self.datapath.data_tos_reg_1, self.datapath.data_tos_reg_2, Opcode.ADD)
+        self.datapath.signal_write_mem(self.datapath.pc, res)
+        self.tick()
+
+        self.datapath.signal_write_data_stack(self.datapath.data_tos_reg_1)
+        self.datapath.signal_latch_pc(self.datapath.address_tos_reg_1 + 1)
+        self.tick()
+
+        logging.debug("%s", self.__repr__())
+
+    def __repr__(self):
+        return format_state(
+            self.ticks,
+            self.datapath.pc,
+            self.datapath.data_tos_reg_1,
+            self.datapath.data_tos_reg_2,
+            self.datapath.address_tos_reg_1,
+            self.datapath.alu.z_flag,
+            self.datapath.data_stack,
+            self.datapath.address_stack,
+            self.cur_instruction,
+            self.cur_operand,
+        )
 
 
 def read_input(fn: str) -> list[int]:
@@ -505,58 +893,91 @@ def read_input(fn: str) -> list[int]:
         return data
 
 
-def simulation(code: list[MemoryCell], input_data: list[int]) -> tuple[list[int], int, int]:
-    io: IO = IO({STDIN: input_data, STDOUT: []})
+def uniform_input_schedule(input_data: list[int], interval: int) -> list[int]:
+    return [interval * (i + 1) for i in range(len(input_data))]
+
+
+def create_io(input_data: list[int], input_schedule: list[int] | None = None) -> IO:
+    if input_schedule is None:
+        return IO({STDIN: input_data, STDOUT: []})
+    assert len(input_schedule) == len(input_data), "Input schedule must have an arrival tick for every token"
+    return IO({STDIN: [], STDOUT: []}, [(tick, STDIN, value) for tick, value in zip(input_schedule, input_data)])
+
+
+def simulation(
+    code: list[MemoryCell],
+    input_data: list[int],
+    input_schedule: list[int] | None = None,
+    call_cache: CallCache | None = None,
+    runner: Callable[[ControlUnit], None] | None = None,
+    metrics: MetricsCollector | None = None,
+) -> tuple[list[int], int, int]:
+    io: IO = create_io(input_data, input_schedule)
     datapath: DataPath = DataPath(code, io)
 
-    control_unit: ControlUnit = ControlUnit(datapath)
-    instruction_counter: int = 0
+    control_unit: ControlUnit = ControlUnit(datapath, call_cache)
+    if metrics is not None:
+        metrics.attach(control_unit)
 
     control_unit.init_cycle()
 
     try:
-        while instruction_counter < INSTRUCTIONS_LIMIT:
-            control_unit.decode_and_execute_instruction()
-            instruction_counter += 1
+        if runner is not None:
+            runner(control_unit)
+        else:
+            while control_unit.instructions < INSTRUCTIONS_LIMIT:
+                control_unit.decode_and_execute_instruction()
     except HaltProgramError:
-        instruction_counter += 1
         pass
 
-    if instruction_counter == INSTRUCTIONS_LIMIT:
+    if metrics is not None:
+        metrics.finish(control_unit)
+
+    if control_unit.instructions == INSTRUCTIONS_LIMIT:
         logging.warning("Instruction limit")
 
     return (
         control_unit.datapath.io.ports[STDOUT],
-        instruction_counter,
+        control_unit.instructions,
         control_unit.ticks,
     )
 
 
-def main(source_code_fn: str, input_data_fn: str) -> None:
+def print_output(res: tuple[list[int], int, int]) -> None:
+    output, instructions, ticks = res
+    if len(output) != 0:
+        try:
+            print("".join([chr(x) for x in output]))
+        except ValueError:
+            for x in output:
+                print(x)
+    print(f"instruction_count: {instructions}, ticks: {ticks}")
+
+
+def main(source_code_fn: str, input_data_fn: str, arrival_interval: int | None = None) -> None:
     machine_code: list[MemoryCell] = read_code(source_code_fn)
     input_str: list[int] = read_input(input_data_fn)
 
-    res = simulation(machine_code, input_str)
+    input_schedule: list[int] | None = None
+    if arrival_interval is not None:
+        input_schedule = uniform_input_schedule(input_str, arrival_interval)
 
-    if len(res[0]) != 0:
-        try:
-            print("".join([chr(x) for x in res[0]]))
-        except ValueError:
-            [print(x) for x in res[0]]
-    print(f"instruction_count: {res[1]}, ticks: {res[2]}".rstrip("\n"))
+    print_output(simulation(machine_code, input_str, input_schedule))
 
 
 if __name__ == "__main__":
-    assert 4 >= len(sys.argv) >= 3, (
-        "Invalid usage: usage - machine.py <source_code_fn> <input_data_fn> <log_level> - " "optional"
+    assert 5 >= len(sys.argv) >= 3, (
+        "Invalid usage: usage - machine.py <source_code_fn> <input_data_fn> <log_level> - "
+        "optional <arrival_interval> - optional"
     )
-    if len(sys.argv) == 4:
-        _, source, input_data, log_level = sys.argv
+    if len(sys.argv) >= 4:
+        _, source, input_data, log_level, *interval = sys.argv
         log_level = log_level.upper()
+        arrival_interval = int(interval[0]) if interval else None
         try:
             logging.basicConfig(level=logging.getLevelName(log_level), format="%(levelname)s: %(funcName)s:%(message)s")
             logging.getLogger().setLevel(logging.getLevelName(log_level))
-            main(source, input_data)
+            main(source, input_data, arrival_interval)
         except ValueError:
             print(f"Invalid log level: Available log levels {list(logging.getLevelNamesMapping().keys())}")
     else:
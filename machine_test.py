@@ -0,0 +1,111 @@
+import pytest
+from constants import INTERRUPT_VECTOR_ADDRESS, MAX_NUMBER, MEMORY_SIZE, MIN_NUMBER, WORD_SIZE
+from isa import MemoryCell
+from machine import simulation, uniform_input_schedule
+from program_loader import build_program
+
+BLOCK_INPUT = """
+section .data:
+section .text:
+    lit {addr}
+    {opcode} 0
+    halt
+"""
+
+
+@pytest.mark.parametrize(("opcode", "addr"), [("ins", MEMORY_SIZE - 5), ("insb", MEMORY_SIZE - 2), ("ins", -1)])
+def test_block_input_out_of_memory(opcode, addr):
+    code = build_program(BLOCK_INPUT.format(addr=addr, opcode=opcode))
+    input_data = [5, *[ord(x) for x in "hello"]]
+
+    with pytest.raises(AssertionError, match="Memory write fault"):
+        simulation(code, input_data)
+    assert input_data == [ord(x) for x in "hello"]
+
+
+@pytest.mark.parametrize("opcode", ["ins", "insb"])
+def test_block_input_negative_length(opcode):
+    code = build_program(BLOCK_INPUT.format(addr=100, opcode=opcode))
+    input_data = [-2, *[ord(x) for x in "hello"]]
+
+    with pytest.raises(AssertionError, match="Negative block length"):
+        simulation(code, input_data)
+    assert input_data == [ord(x) for x in "hello"]
+
+
+@pytest.mark.parametrize(("opcode", "addr"), [("ins", MEMORY_SIZE - 6), ("insb", MEMORY_SIZE - 3)])
+def test_block_input_fills_memory_end(opcode, addr):
+    code = build_program(BLOCK_INPUT.format(addr=addr, opcode=opcode))
+
+    assert simulation(code, [5, *[ord(x) for x in "hello"]])[0] == []
+
+
+PACKED_HIGH_BYTES = """
+section .data:
+    text: .packed "abcé"
+    buffer: bf 4
+section .text:
+    lit text
+    outsb 1
+    lit buffer
+    insb 0
+    lit buffer
+    outsb 1
+    lit 255
+    lit buffer
+    inc
+    lit 4
+    mul
+    lit 3
+    add
+    popb
+    lit buffer
+    outsb 1
+    lit buffer
+    inc
+    push
+    out 1
+    halt
+"""
+
+
+def test_packed_words_fit_machine_word():
+    code = build_program(PACKED_HIGH_BYTES)
+    words = [cell.arg for cell in code if cell.opcode is None]
+    assert all(MIN_NUMBER <= x <= MAX_NUMBER for x in words)
+
+    output = simulation(code, [4, *[ord(x) for x in "xyz!"]])[0]
+    assert output[:-1] == [ord(x) for x in "abcé" + "xyz!" + "xyzÿ"]
+    assert output[-1] == -(1 << WORD_SIZE) + int.from_bytes("xyzÿ".encode("latin-1"), "little")
+
+
+INTERRUPT_WITHOUT_VECTOR = """
+section .data:
+    count: 3
+section .text:
+    ei
+    halt
+"""
+
+
+def test_ei_requires_interrupt_vector():
+    with pytest.raises(AssertionError, match="requires variable int_vector"):
+        build_program(INTERRUPT_WITHOUT_VECTOR)
+
+
+def test_interrupt_checks_vector_cell():
+    with open("examples/cat_interrupt.txt", encoding="utf-8") as f:
+        code = build_program(f.read())
+    code[INTERRUPT_VECTOR_ADDRESS] = MemoryCell(INTERRUPT_VECTOR_ADDRESS, None, INTERRUPT_VECTOR_ADDRESS + 1)
+    input_data = [2, ord("h"), ord("i")]
+
+    with pytest.raises(AssertionError, match="does not hold an interrupt vector"):
+        simulation(code, input_data, uniform_input_schedule(input_data, 50))
+
+
+@pytest.mark.parametrize("value", [256, 1000, -3])
+def test_packed_input_rejects_non_byte_values(value):
+    code = build_program(BLOCK_INPUT.format(addr=100, opcode="insb"))
+
+    with pytest.raises(AssertionError, match="non 8-bit characters"):
+        simulation(code, [3, ord("a"), value, ord("b")])
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import logging
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from constants import INSTRUCTIONS_LIMIT
+from isa import MemoryCell, Opcode, read_code
+from machine import ControlUnit, print_output, read_input, simulation
+
+PURE_OPCODES: set[Opcode] = {
+    Opcode.ADD,
+    Opcode.SUB,
+    Opcode.MUL,
+    Opcode.DIV,
+    Opcode.MOD,
+    Opcode.CMP,
+    Opcode.INC,
+    Opcode.DEC,
+    Opcode.DUP,
+    Opcode.SWITCH,
+    Opcode.DROP,
+    Opcode.LIT,
+    Opcode.JMP,
+    Opcode.JZ,
+    Opcode.JNZ,
+    Opcode.CALL,
+    Opcode.RET,
+}
+
+DATA_STACK_POPS: dict[Opcode, int] = {
+    Opcode.ADD: 2,
+    Opcode.SUB: 2,
+    Opcode.MUL: 2,
+    Opcode.DIV: 2,
+    Opcode.MOD: 2,
+    Opcode.CMP: 2,
+    Opcode.INC: 1,
+    Opcode.DEC: 1,
+    Opcode.DUP: 1,
+    Opcode.SWITCH: 2,
+    Opcode.DROP: 1,
+}
+
+DATA_STACK_REG_2_OPCODES: set[Opcode] = {
+    Opcode.ADD,
+    Opcode.SUB,
+    Opcode.MUL,
+    Opcode.DIV,
+    Opcode.MOD,
+    Opcode.CMP,
+    Opcode.SWITCH,
+}
+
+
+def is_instruction(code: list[MemoryCell], addr: int) -> bool:
+    return 0 <= addr < len(code) and isinstance(code[addr], MemoryCell) and code[addr].opcode is not None
+
+
+def is_pure_subroutine(code: list[MemoryCell], entry: int, pure: dict[int, bool | None]) -> bool:
+    if entry in pure:
+        return pure[entry] is True
+    pure[entry] = None
+
+    visited: set[int] = set()
+    worklist: list[int] = [entry]
+    while worklist:
+        addr = worklist.pop()
+        if addr in visited:
+            continue
+        visited.add(addr)
+        if not is_instruction(code, addr) or code[addr].opcode not in PURE_OPCODES:
+            pure[entry] = False
+            return False
+        opcode = code[addr].opcode
+        if opcode == Opcode.RET:
+            continue
+        if opcode == Opcode.CALL and not is_pure_subroutine(code, code[addr].arg, pure):
+            pure[entry] = False
+            return False
+        if opcode in {Opcode.JMP, Opcode.JZ, Opcode.JNZ}:
+            worklist.append(code[addr].arg)
+        if opcode != Opcode.JMP:
+            worklist.append(addr + 1)
+
+    pure[entry] = True
+    return True
+
+
+def find_pure_subroutines(code: list[MemoryCell]) -> set[int]:
+    pure: dict[int, bool | None] = {}
+    entries = {cell.arg for cell in code if isinstance(cell, MemoryCell) and cell.opcode == Opcode.CALL}
+    return {entry for entry in entries if is_pure_subroutine(code, entry, pure)}
+
+
+def add_counts(target: dict[Opcode, int], source: dict[Opcode, int]) -> None:
+    for opcode, count in source.items():
+        target[opcode] = target.get(opcode, 0) + count
+
+
+@dataclass
+class CallEffect:
+    outputs: tuple[int, ...]
+    z_flag: int
+    data_tos_reg_1: int
+    data_tos_reg_2: int | None
+    ticks: int
+    instructions: int
+    opcodes: dict[Opcode, int] = field(default_factory=dict)
+
+
+@dataclass
+class CallFrame:
+    entry: int
+    return_pc: int
+    address_depth: int
+    min_depth: int
+    z_flag: int
+    ticks: int
+    instructions: int
+    inputs: list[int] = field(default_factory=list)
+    writes_reg_2: bool = False
+    opcodes: dict[Opcode, int] = field(default_factory=dict)
+
+
+class CallCache:
+    def __init__(self, code: list[MemoryCell], capacity: int = 1024):
+        self.pure_entries: set[int] = find_pure_subroutines(code)
+        self.capacity: int = capacity
+        self.entries: OrderedDict[tuple, CallEffect] = OrderedDict()
+        self.arities: dict[int, set[int]] = {}
+        self.frames: list[CallFrame] = []
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.skipped_opcodes: dict[Opcode, int] = {}
+
+    def lookup(self, control_unit: ControlUnit, entry: int) -> tuple[int, CallEffect] | None:
+        data_stack = control_unit.datapath.data_stack
+        z_flag = control_unit.datapath.alu.z_flag
+        for arity in self.arities.get(entry, ()):
+            if arity > len(data_stack):
+                continue
+            key = (entry, z_flag, tuple(data_stack[len(data_stack) - arity :]))
+            effect = self.entries.get(key)
+            if effect is not None:
+                self.entries.move_to_end(key)
+                return arity, effect
+        return None
+
+    def apply(self, control_unit: ControlUnit) -> bool:
+        datapath = control_unit.datapath
+        entry = datapath.signal_read_mem(datapath.pc).arg
+        if entry not in self.pure_entries or control_unit.interrupts_enabled:
+            return False
+
+        found = self.lookup(control_unit, entry)
+        if found is not None and control_unit.instructions - 1 + found[1].instructions <= INSTRUCTIONS_LIMIT:
+            arity, effect = found
+            self.lower(datapath.data_stack, len(datapath.data_stack) - arity)
+            for _ in range(arity):
+                datapath.signal_read_data_stack()
+            for value in effect.outputs:
+                datapath.signal_write_data_stack(value)
+            datapath.signal_latch_data_stack_reg_1(effect.data_tos_reg_1)
+            if effect.data_tos_reg_2 is not None:
+                datapath.signal_latch_data_stack_reg_2(effect.data_tos_reg_2)
+                self.mark_reg_2_written()
+            datapath.signal_latch_top_address_stack(datapath.pc + 1)
+            datapath.signal_latch_pc(datapath.pc + 1)
+            datapath.alu.z_flag = effect.z_flag
+            control_unit.ticks += effect.ticks - 1
+            control_unit.instructions += effect.instructions - 1
+            add_counts(self.skipped_opcodes, effect.opcodes)
+            if self.frames:
+                add_counts(self.frames[-1].opcodes, effect.opcodes)
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        depth = len(datapath.data_stack)
+        self.frames.append(
+            CallFrame(
+                entry,
+                datapath.pc + 1,
+                len(datapath.address_stack) + 1,
+                depth,
+                datapath.alu.z_flag,
+                control_unit.ticks - 1,
+                control_unit.instructions - 1,
+            )
+        )
+        return False
+
+    def observe(self, control_unit: ControlUnit, opcode: Opcode) -> None:
+        data_stack = control_unit.datapath.data_stack
+        self.lower(data_stack, len(data_stack) - DATA_STACK_POPS.get(opcode, 0))
+        if opcode in DATA_STACK_REG_2_OPCODES:
+            self.mark_reg_2_written()
+        opcodes = self.frames[-1].opcodes
+        opcodes[opcode] = opcodes.get(opcode, 0) + 1
+
+    def mark_reg_2_written(self) -> None:
+        if self.frames:
+            self.frames[-1].writes_reg_2 = True
+
+    def lower(self, data_stack: list[int], low: int) -> None:
+        for frame in reversed(self.frames):
+            if low >= frame.min_depth:
+                break
+            frame.inputs[:0] = data_stack[low : frame.min_depth]
+            frame.min_depth = low
+
+    def complete(self, control_unit: ControlUnit) -> None:
+        datapath = control_unit.datapath
+        frame = self.frames[-1]
+        if len(datapath.address_stack) != frame.address_depth - 1 or datapath.pc != frame.return_pc:
+            return
+        self.frames.pop()
+
+        key = (frame.entry, frame.z_flag, tuple(frame.inputs))
+        self.entries[key] = CallEffect(
+            tuple(datapath.data_stack[frame.min_depth :]),
+            datapath.alu.z_flag,
+            datapath.data_tos_reg_1,
+            datapath.data_tos_reg_2 if frame.writes_reg_2 else None,
+            control_unit.ticks - frame.ticks,
+            control_unit.instructions - frame.instructions,
+            frame.opcodes,
+        )
+        if frame.writes_reg_2:
+            self.mark_reg_2_written()
+        if self.frames:
+            add_counts(self.frames[-1].opcodes, frame.opcodes)
+        self.arities.setdefault(frame.entry, set()).add(len(frame.inputs))
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def abort(self) -> None:
+        self.frames.clear()
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        return (
+            f"pure subroutines: {sorted(self.pure_entries)}, hits: {self.hits}, misses: {self.misses}, "
+            f"hit rate: {hit_rate:.1f}%, evictions: {self.evictions}, cached: {len(self.entries)}"
+        )
+
+
+def main(source_code_fn: str, input_data_fn: str, capacity: int = 1024) -> None:
+    machine_code: list[MemoryCell] = read_code(source_code_fn)
+    input_str: list[int] = read_input(input_data_fn)
+
+    call_cache = CallCache(machine_code, capacity)
+    print_output(simulation(machine_code, input_str, call_cache=call_cache))
+    print(call_cache.report())
+
+
+if __name__ == "__main__":
+    assert 4 >= len(sys.argv) >= 3, "Usage: memoization.py <source_code_fn> <input_data_fn> <capacity> - optional"
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(funcName)s:%(message)s")
+    main(sys.argv[1], sys.argv[2], *[int(x) for x in sys.argv[3:]])
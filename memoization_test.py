@@ -0,0 +1,72 @@
+import pytest
+from machine import simulation
+from memoization import CallCache, find_pure_subroutines
+from program_loader import build_program, load_program
+
+
+def test_pure_subroutines_detection():
+    assert find_pure_subroutines(load_program("examples/pure_calls.txt")) == {31, 35}
+    assert find_pure_subroutines(load_program("examples/hello_user_name.txt")) == set()
+
+
+@pytest.mark.parametrize("capacity", [1, 2, 1024])
+def test_memoized_run_matches_interpreter(capacity):
+    code = load_program("examples/pure_calls.txt")
+    call_cache = CallCache(code, capacity)
+
+    expected = simulation(code, [])
+    actual = simulation(code, [], call_cache=call_cache)
+
+    assert actual == expected
+    assert len(call_cache.entries) <= capacity
+
+
+def test_memoization_hits_repeated_calls():
+    code = load_program("examples/pure_calls.txt")
+    call_cache = CallCache(code)
+
+    simulation(code, [], call_cache=call_cache)
+
+    assert call_cache.hits == 35
+    assert call_cache.misses == 10
+
+
+def run_registers(code, call_cache=None):
+    control_units = []
+
+    def runner(control_unit):
+        control_units.append(control_unit)
+        while True:
+            control_unit.decode_and_execute_instruction()
+
+    simulation(code, [], call_cache=call_cache, runner=runner)
+    datapath = control_units[0].datapath
+    return (
+        datapath.pc,
+        datapath.data_tos_reg_1,
+        datapath.data_tos_reg_2,
+        datapath.address_tos_reg_1,
+        list(datapath.data_stack),
+        datapath.alu.z_flag,
+    )
+
+
+def test_memoized_call_keeps_unwritten_registers():
+    code = build_program(
+        "section .data:\nsection .text:\n"
+        "    lit 1\n    lit 2\n    switch\n    drop\n    drop\n    lit 5\n    call increment\n"
+        "    lit 3\n    lit 4\n    switch\n    drop\n    drop\n    lit 5\n    call increment\n"
+        "    lit 6\n    lit 7\n    switch\n    drop\n    drop\n    lit 5\n    call increment\n"
+        "    halt\n"
+        "    increment:\n        inc\n        ret\n"
+    )
+    call_cache = CallCache(code)
+
+    assert run_registers(code, call_cache) == run_registers(code)
+    assert call_cache.hits == 1
+
+
+def test_memoized_run_keeps_register_state():
+    code = load_program("examples/pure_calls.txt")
+
+    assert run_registers(code, CallCache(code)) == run_registers(code)
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+from constants import INSTRUCTIONS_LIMIT
+from isa import MemoryCell, Opcode, read_code
+from machine import ControlUnit, Port, read_input, simulation
+
+METRICS_PREFIX = "stack_machine"
+
+
+@dataclass
+class RunMetrics:
+    runs: int = 0
+    wall_seconds: float = 0.0
+    instructions: int = 0
+    ticks: int = 0
+    interrupts: int = 0
+    instruction_limits: int = 0
+    opcodes: dict[str, int] = field(default_factory=dict)
+    memory_reads: int = 0
+    memory_writes: int = 0
+    port_in: dict[int, int] = field(default_factory=dict)
+    port_out: dict[int, int] = field(default_factory=dict)
+    max_data_stack_depth: int = 0
+    max_address_stack_depth: int = 0
+    alu_overflows: int = 0
+
+    def instructions_per_second(self) -> float:
+        return self.instructions / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "wall_seconds": self.wall_seconds,
+            "instructions": self.instructions,
+            "ticks": self.ticks,
+            "instructions_per_second": self.instructions_per_second(),
+            "ticks_per_second": self.ticks_per_second(),
+            "interrupts": self.interrupts,
+            "instruction_limits": self.instruction_limits,
+            "opcodes": dict(sorted(self.opcodes.items())),
+            "memory_reads": self.memory_reads,
+            "memory_writes": self.memory_writes,
+            "port_in": {str(port): x for port, x in sorted(self.port_in.items())},
+            "port_out": {str(port): x for port, x in sorted(self.port_out.items())},
+            "max_data_stack_depth": self.max_data_stack_depth,
+            "max_address_stack_depth": self.max_address_stack_depth,
+            "alu_overflows": self.alu_overflows,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=1)
+
+    def to_prometheus(self, prefix: str = METRICS_PREFIX) -> str:
+        lines: list[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list[tuple[str, float]]) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(f"{prefix}_{name}{labels} {value}" for labels, value in samples)
+
+        metric("runs_total", "counter", "Simulation runs.", [("", self.runs)])
+        metric("wall_seconds_total", "counter", "Wall-clock time spent in simulation.", [("", self.wall_seconds)])
+        metric("instructions_total", "counter", "Executed instructions.", [("", self.instructions)])
+        metric("ticks_total", "counter", "Simulated processor ticks.", [("", self.ticks)])
+        metric(
+            "instructions_per_second",
+            "gauge",
+            "Executed instructions per wall-clock second.",
+            [("", self.instructions_per_second())],
+        )
+        metric("ticks_per_second", "gauge", "Simulated ticks per wall-clock second.", [("", self.ticks_per_second())])
+        metric("interrupts_total", "counter", "Entered interrupts.", [("", self.interrupts)])
+        metric(
+            "instruction_limits_total",
+            "counter",
+            "Runs stopped by the instruction limit.",
+            [("", self.instruction_limits)],
+        )
+        metric(
+            "opcode_executions_total",
+            "counter",
+            "Executed instructions by opcode.",
+            [(f'{{opcode="{opcode}"}}', x) for opcode, x in sorted(self.opcodes.items())],
+        )
+        metric("memory_reads_total", "counter", "Memory reads including instruction fetch.", [("", self.memory_reads)])
+        metric("memory_writes_total", "counter", "Memory writes.", [("", self.memory_writes)])
+        metric(
+            "port_values_total",
+            "counter",
+            "Values transferred through IO ports.",
+            [(f'{{port="{port}",direction="in"}}', x) for port, x in sorted(self.port_in.items())]
+            + [(f'{{port="{port}",direction="out"}}', x) for port, x in sorted(self.port_out.items())],
+        )
+        metric(
+            "max_stack_depth",
+            "gauge",
+            "Maximum stack depth.",
+            [
+                ('{stack="data"}', self.max_data_stack_depth),
+                ('{stack="address"}', self.max_address_stack_depth),
+            ],
+        )
+        metric("alu_overflows_total", "counter", "ALU results wrapped on overflow.", [("", self.alu_overflows)])
+        return "\n".join(lines) + "\n"
+
+
+def merge_counts(target: dict, source: dict) -> None:
+    for key, value in source.items():
+        target[key] = target.get(key, 0) + value
+
+
+def aggregate(runs: list[RunMetrics]) -> RunMetrics:
+    total = RunMetrics()
+    for run in runs:
+        total.runs += run.runs
+        total.wall_seconds += run.wall_seconds
+        total.instructions += run.instructions
+        total.ticks += run.ticks
+        total.interrupts += run.interrupts
+        total.instruction_limits += run.instruction_limits
+        merge_counts(total.opcodes, run.opcodes)
+        total.memory_reads += run.memory_reads
+        total.memory_writes += run.memory_writes
+        merge_counts(total.port_in, run.port_in)
+        merge_counts(total.port_out, run.port_out)
+        total.max_data_stack_depth = max(total.max_data_stack_depth, run.max_data_stack_depth)
+        total.max_address_stack_depth = max(total.max_address_stack_depth, run.max_address_stack_depth)
+        total.alu_overflows += run.alu_overflows
+    return total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total: RunMetrics = RunMetrics()
+
+    def record(self, run: RunMetrics) -> None:
+        with self.lock:
+            self.total = aggregate([self.total, run])
+
+    def snapshot(self) -> RunMetrics:
+        with self.lock:
+            return aggregate([self.total])
+
+
+class MetricsCollector:
+    def __init__(self, registry: MetricsRegistry | None = None):
+        self.registry: MetricsRegistry | None = registry
+        self.result: RunMetrics = RunMetrics(runs=1)
+        self.started: float = 0.0
+        self.overflows: int = 0
+        self.skipped_opcodes: dict[Opcode, int] = {}
+
+    def attach(self, control_unit: ControlUnit) -> None:
+        result = self.result
+        datapath = control_unit.datapath
+        io = datapath.io
+        execute = control_unit.decode_and_execute_instruction
+        enter_interrupt = control_unit.enter_interrupt
+        read_mem, write_mem = datapath.signal_read_mem, datapath.signal_write_mem
+        write_data_stack = datapath.signal_write_data_stack
+        write_address_stack = datapath.signal_write_top_address_stack
+        read, write, read_block, write_block = io.read, io.write, io.read_block, io.write_block
+        opcodes = result.opcodes
+
+        def decode_and_execute_instruction() -> None:
+            try:
+                execute()
+            finally:
+                opcode = str(control_unit.cur_instruction)
+                opcodes[opcode] = opcodes.get(opcode, 0) + 1
+
+        def count_interrupt() -> None:
+            result.interrupts += 1
+            enter_interrupt()
+
+        def signal_read_mem(addr: int) -> MemoryCell:
+            result.memory_reads += 1
+            return read_mem(addr)
+
+        def signal_write_mem(addr: int, value: int) -> None:
+            result.memory_writes += 1
+            write_mem(addr, value)
+
+        def signal_write_data_stack(value: int) -> None:
+            write_data_stack(value)
+            result.max_data_stack_depth = max(result.max_data_stack_depth, len(datapath.data_stack))
+
+        def signal_write_top_address_stack(value: int) -> None:
+            write_address_stack(value)
+            result.max_address_stack_depth = max(result.max_address_stack_depth, len(datapath.address_stack))
+
+        def io_read(port: Port) -> int:
+            value = read(port)
+            result.port_in[port.value] = result.port_in.get(port.value, 0) + 1
+            return value
+
+        def io_write(port: Port, value: int) -> None:
+            write(port, value)
+            result.port_out[port.value] = result.port_out.get(port.value, 0) + 1
+
+        def io_read_block(port: Port, count: int) -> list[int]:
+            values = read_block(port, count)
+            result.port_in[port.value] = result.port_in.get(port.value, 0) + len(values)
+            return values
+
+        def io_write_block(port: Port, values: list[int]) -> None:
+            write_block(port, values)
+            result.port_out[port.value] = result.port_out.get(port.value, 0) + len(values)
+
+        control_unit.decode_and_execute_instruction = decode_and_execute_instruction
+        control_unit.enter_interrupt = count_interrupt
+        datapath.signal_read_mem = signal_read_mem
+        datapath.signal_write_mem = signal_write_mem
+        datapath.signal_write_data_stack = signal_write_data_stack
+        datapath.signal_write_top_address_stack = signal_write_top_address_stack
+        io.read, io.write, io.read_block, io.write_block = io_read, io_write, io_read_block, io_write_block
+
+        self.overflows = datapath.alu.overflows
+        if control_unit.call_cache is not None:
+            self.skipped_opcodes = dict(control_unit.call_cache.skipped_opcodes)
+        self.started = time.perf_counter()
+
+    def finish(self, control_unit: ControlUnit) -> None:
+        result = self.result
+        result.wall_seconds = time.perf_counter() - self.started
+        result.instructions = control_unit.instructions
+        result.ticks = control_unit.ticks
+        result.instruction_limits = int(control_unit.instructions >= INSTRUCTIONS_LIMIT)
+        result.alu_overflows = control_unit.datapath.alu.overflows - self.overflows
+        if control_unit.call_cache is not None:
+            for opcode, count in control_unit.call_cache.skipped_opcodes.items():
+                skipped = count - self.skipped_opcodes.get(opcode, 0)
+                if skipped:
+                    result.opcodes[str(opcode)] = result.opcodes.get(str(opcode), 0) + skipped
+        if self.registry is not None:
+            self.registry.record(result)
+
+
+def measure(code: list[MemoryCell], input_data: list[int], registry: MetricsRegistry | None = None) -> RunMetrics:
+    collector = MetricsCollector(registry)
+    simulation(code, input_data, metrics=collector)
+    return collector.result
+
+
+def main(output_format: str, programs: list[tuple[str, str]]) -> None:
+    assert output_format in ("json", "prometheus"), f"Unknown format {output_format}, use json or prometheus"
+    registry = MetricsRegistry()
+    for source_code_fn, input_data_fn in programs:
+        measure(read_code(source_code_fn), read_input(input_data_fn), registry)
+
+    total = registry.snapshot()
+    if output_format == "json":
+        print(total.to_json())
+    else:
+        print(total.to_prometheus(), end="")
+
+
+if __name__ == "__main__":
+    usage = (
+        "Usage: metrics.py <json|prometheus> <machine_code_file> <input_file> [<machine_code_file> <input_file> ...]"
+    )
+    assert len(sys.argv) >= 4, usage
+    assert len(sys.argv) % 2 == 0, usage
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(funcName)s:%(message)s")
+    main(sys.argv[1], list(zip(sys.argv[2::2], sys.argv[3::2])))
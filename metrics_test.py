@@ -0,0 +1,78 @@
+import json
+
+from constants import MAX_NUMBER
+from machine import simulation
+from memoization import CallCache
+from metrics import MetricsCollector, MetricsRegistry, aggregate, measure
+from program_loader import build_program, load_program
+
+HELLO = [5, *[ord(x) for x in "hello"]]
+
+OVERFLOW = f"""
+section .data:
+    value: {MAX_NUMBER}
+section .text:
+    lit value
+    push
+    inc
+    inc
+    halt
+"""
+
+
+def test_metrics_do_not_change_simulation():
+    code = load_program("examples/cat.txt")
+    collector = MetricsCollector()
+
+    assert simulation(code, list(HELLO), metrics=collector) == simulation(code, list(HELLO))
+
+
+def test_cat_metrics():
+    code = load_program("examples/cat.txt")
+    instructions, ticks = simulation(code, list(HELLO))[1:]
+    metrics = measure(code, list(HELLO))
+
+    assert (metrics.runs, metrics.instructions, metrics.ticks) == (1, instructions, ticks)
+    assert sum(metrics.opcodes.values()) == instructions
+    assert metrics.opcodes["in"] == 6
+    assert metrics.port_in == {0: 6}
+    assert metrics.port_out == {1: 5}
+    assert metrics.memory_writes == metrics.opcodes["pop"]
+    assert metrics.max_data_stack_depth == 2
+    assert metrics.max_address_stack_depth == 0
+    assert metrics.instructions_per_second() > 0
+
+
+def test_alu_overflow_count():
+    assert measure(build_program(OVERFLOW), []).alu_overflows == 1
+
+
+def test_aggregation_and_export():
+    registry = MetricsRegistry()
+    cat = measure(load_program("examples/cat.txt"), list(HELLO), registry)
+    calls = measure(load_program("examples/pure_calls.txt"), [], registry)
+    total = registry.snapshot()
+
+    assert total == aggregate([cat, calls])
+    assert total.runs == 2
+    assert total.instructions == cat.instructions + calls.instructions
+    assert total.opcodes["lit"] == cat.opcodes["lit"] + calls.opcodes["lit"]
+    assert total.max_address_stack_depth == calls.max_address_stack_depth == 2
+
+    assert json.loads(total.to_json())["port_in"] == {"0": 6}
+    text = total.to_prometheus()
+    assert "# TYPE stack_machine_instructions_total counter" in text
+    assert f"stack_machine_instructions_total {total.instructions}\n" in text
+    assert f'stack_machine_opcode_executions_total{{opcode="call"}} {total.opcodes["call"]}\n' in text
+    assert f'stack_machine_port_values_total{{port="1",direction="out"}} {total.port_out[1]}\n' in text
+
+
+def test_memoized_calls_keep_opcode_histogram():
+    code = load_program("examples/pure_calls.txt")
+    call_cache = CallCache(code)
+    collector = MetricsCollector()
+    simulation(code, [], call_cache=call_cache, metrics=collector)
+
+    assert call_cache.hits > 0
+    assert sum(collector.result.opcodes.values()) == collector.result.instructions
+    assert collector.result.opcodes == measure(code, []).opcodes
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import logging
+import sys
+from dataclasses import dataclass
+
+from constants import BYTES_PER_WORD, INSTRUCTIONS_LIMIT
+from exception import HaltProgramError
+from isa import MemoryCell, Opcode, read_code
+from machine import IO, STDOUT, ControlUnit, DataPath, create_io, print_output, read_input, uniform_input_schedule
+
+ROUND_ROBIN = "round-robin"
+TICK = "tick"
+SCHEDULING_POLICIES: set[str] = {ROUND_ROBIN, TICK}
+
+MEMORY_OPCODES: set[Opcode] = {
+    Opcode.PUSH,
+    Opcode.POP,
+    Opcode.XADD,
+    Opcode.PUSHB,
+    Opcode.POPB,
+    Opcode.INS,
+    Opcode.OUTS,
+    Opcode.INSB,
+    Opcode.OUTSB,
+}
+
+BYTE_ADDRESSED_OPCODES: set[Opcode] = {Opcode.PUSHB, Opcode.POPB}
+
+
+@dataclass
+class CoreStats:
+    core_id: int
+    started: bool = False
+    halted: bool = False
+    start_tick: int = 0
+    end_tick: int = 0
+    instructions: int = 0
+    busy_ticks: int = 0
+    memory_accesses: int = 0
+    stalls: int = 0
+    stall_ticks: int = 0
+    shared_accesses: int = 0
+
+
+class MultiCoreMachine:
+    def __init__(self, code: list[MemoryCell], io: IO, cores: int = 2, scheduling: str = TICK):
+        assert cores > 0, "Number of cores must be positive"
+        assert scheduling in SCHEDULING_POLICIES, f"Unknown scheduling {scheduling}, use {sorted(SCHEDULING_POLICIES)}"
+        self.scheduling: str = scheduling
+        self.cores: list[ControlUnit] = []
+        for core_id in range(cores):
+            datapath = DataPath(code, io)
+            if core_id > 0:
+                datapath.memory = self.cores[0].datapath.memory
+            control_unit = ControlUnit(datapath, core_id=core_id)
+            control_unit.spawner = self.spawn
+            self.cores.append(control_unit)
+        self.stats: list[CoreStats] = [CoreStats(core_id) for core_id in range(cores)]
+        self.running: list[bool] = [False] * cores
+        self.turn: int = 0
+        self.bus_free: int = 0
+        self.last_access: dict[int, int] = {}
+
+    def start(self) -> None:
+        control_unit = self.cores[0]
+        control_unit.init_cycle()
+        self.running[0] = True
+        self.stats[0].started = True
+        self.stats[0].end_tick = control_unit.ticks
+
+    def spawn(self, parent: ControlUnit, entry: int, arg: int) -> int:
+        for core_id, stats in enumerate(self.stats):
+            if stats.started:
+                continue
+            control_unit = self.cores[core_id]
+            control_unit.datapath.signal_write_data_stack(arg)
+            control_unit.datapath.signal_latch_pc(entry)
+            control_unit.ticks = parent.ticks
+            self.running[core_id] = True
+            stats.started = True
+            stats.start_tick = stats.end_tick = parent.ticks
+            logging.debug("core %s spawns core %s at %s", parent.core_id, core_id, entry)
+            return core_id
+        return -1
+
+    def next_core(self) -> int | None:
+        running = [core_id for core_id, x in enumerate(self.running) if x]
+        if not running:
+            return None
+        if self.scheduling == TICK:
+            return min(running, key=lambda core_id: (self.cores[core_id].ticks, core_id))
+        core_id = next((x for x in running if x >= self.turn), running[0])
+        self.turn = core_id + 1
+        return core_id
+
+    def access_address(self, control_unit: ControlUnit, opcode: Opcode) -> int | None:
+        data_stack = control_unit.datapath.data_stack
+        if not data_stack:
+            return None
+        if opcode in BYTE_ADDRESSED_OPCODES:
+            return data_stack[-1] // BYTES_PER_WORD
+        return data_stack[-1]
+
+    def acquire_bus(self, core_id: int, opcode: Opcode) -> None:
+        control_unit, stats = self.cores[core_id], self.stats[core_id]
+        stats.memory_accesses += 1
+        addr = self.access_address(control_unit, opcode)
+        if addr is not None:
+            if self.last_access.get(addr, core_id) != core_id:
+                stats.shared_accesses += 1
+            self.last_access[addr] = core_id
+        if self.scheduling == TICK and control_unit.ticks < self.bus_free:
+            stats.stalls += 1
+            stats.stall_ticks += self.bus_free - control_unit.ticks
+            control_unit.ticks = self.bus_free
+
+    def step(self, core_id: int) -> None:
+        control_unit, stats = self.cores[core_id], self.stats[core_id]
+        ticks = control_unit.ticks
+        cell = control_unit.datapath.memory[control_unit.datapath.pc]
+        opcode = cell.opcode if isinstance(cell, MemoryCell) else None
+        if opcode in MEMORY_OPCODES:
+            self.acquire_bus(core_id, opcode)
+        try:
+            control_unit.decode_and_execute_instruction()
+        except HaltProgramError:
+            self.running[core_id] = False
+            stats.halted = True
+        if opcode in MEMORY_OPCODES:
+            self.bus_free = control_unit.ticks
+        if control_unit.instructions >= INSTRUCTIONS_LIMIT:
+            self.running[core_id] = False
+        stats.instructions = control_unit.instructions
+        stats.busy_ticks += control_unit.ticks - ticks
+        stats.end_tick = control_unit.ticks
+
+    def run(self) -> None:
+        self.start()
+        while True:
+            core_id = self.next_core()
+            if core_id is None:
+                break
+            self.step(core_id)
+
+    def instructions(self) -> int:
+        return sum(x.instructions for x in self.stats)
+
+    def ticks(self) -> int:
+        return max(x.end_tick for x in self.stats if x.started)
+
+    def report(self) -> str:
+        lines = [f"cores: {len(self.cores)}, scheduling: {self.scheduling}"]
+        for stats in self.stats:
+            if not stats.started:
+                lines.append(f"core {stats.core_id}: idle")
+                continue
+            state = "halted" if stats.halted else "stopped"
+            lines.append(
+                f"core {stats.core_id}: {state}, ticks: {stats.start_tick}-{stats.end_tick}, "
+                f"busy: {stats.busy_ticks}, instructions: {stats.instructions}, "
+                f"memory accesses: {stats.memory_accesses}, stalls: {stats.stalls} ({stats.stall_ticks} ticks), "
+                f"shared accesses: {stats.shared_accesses}"
+            )
+        return "\n".join(lines)
+
+
+def multicore_simulation(
+    code: list[MemoryCell],
+    input_data: list[int],
+    cores: int = 2,
+    scheduling: str = TICK,
+    input_schedule: list[int] | None = None,
+) -> tuple[list[int], int, int, MultiCoreMachine]:
+    io: IO = create_io(input_data, input_schedule)
+
+    machine = MultiCoreMachine(code, io, cores, scheduling)
+    machine.run()
+
+    if any(not x.halted for x in machine.stats if x.started):
+        logging.warning("Instruction limit")
+
+    return io.ports[STDOUT], machine.instructions(), machine.ticks(), machine
+
+
+def main(
+    source_code_fn: str,
+    input_data_fn: str,
+    cores: int = 2,
+    scheduling: str = TICK,
+    arrival_interval: int | None = None,
+) -> None:
+    machine_code: list[MemoryCell] = read_code(source_code_fn)
+    input_str: list[int] = read_input(input_data_fn)
+
+    input_schedule: list[int] | None = None
+    if arrival_interval is not None:
+        input_schedule = uniform_input_schedule(input_str, arrival_interval)
+
+    res = multicore_simulation(machine_code, input_str, cores, scheduling, input_schedule)
+
+    print_output(res[:3])
+    print(res[3].report())
+
+
+if __name__ == "__main__":
+    assert 6 >= len(sys.argv) >= 3, (
+        "Usage: multicore.py <source_code_fn> <input_data_fn> <cores> - optional "
+        "<round-robin|tick> - optional <arrival_interval> - optional"
+    )
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(funcName)s:%(message)s")
+    _, source, input_data, *args = sys.argv
+    main(
+        source,
+        input_data,
+        int(args[0]) if len(args) > 0 else 2,
+        args[1] if len(args) > 1 else TICK,
+        int(args[2]) if len(args) > 2 else None,
+    )
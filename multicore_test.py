@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+import pytest
+import translator
+from isa import read_code, write_code
+from machine import simulation
+from multicore import ROUND_ROBIN, TICK, multicore_simulation
+from program_loader import load_program
+
+CORE_IDS = """
+section .data:
+    done: 0
+section .text:
+    lit 7
+    spawn worker
+    out 1
+    coreid
+    out 1
+    wait:
+        lit done
+        push
+        lit 1
+        cmp
+        drop
+        drop
+        jnz wait
+        halt
+    worker:
+        coreid
+        add
+        out 1
+        lit 1
+        lit done
+        pop
+        halt
+"""
+
+
+def test_single_core_matches_simulation():
+    code = load_program("examples/parallel_sum.txt")
+    assert multicore_simulation(code, [], 1)[:3] == simulation(code, [])
+
+
+@pytest.mark.parametrize("scheduling", [ROUND_ROBIN, TICK])
+@pytest.mark.parametrize("cores", [1, 2, 3, 4, 8])
+def test_parallel_sum_result(cores, scheduling):
+    code = load_program("examples/parallel_sum.txt")
+    output, _, _, machine = multicore_simulation(code, [], cores, scheduling)
+
+    assert output == [sum(x * x for x in range(24))]
+    assert all(x.halted for x in machine.stats)
+
+
+def test_parallel_sum_speedup_and_contention():
+    code = load_program("examples/parallel_sum.txt")
+    ticks = [multicore_simulation(code, [], cores, TICK)[2] for cores in (1, 2, 4)]
+    assert ticks[0] > ticks[1] > ticks[2]
+
+    machine = multicore_simulation(code, [], 4, TICK)[3]
+    assert sum(x.stall_ticks for x in machine.stats) > 0
+    assert sum(x.shared_accesses for x in machine.stats) > 0
+    assert machine.stats[1].start_tick > 0
+
+
+def test_coreid_and_spawn():
+    code, _ = translator.translate(CORE_IDS)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "out.json")
+        write_code(code, target, translator.custom_serializer)
+        code = read_code(target)
+
+    assert multicore_simulation(code, [], 2)[0] == [1, 0, 8]
+    assert simulation(code, [])[0] == [-1, 0]
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import os
+import tempfile
+
+import translator
+from isa import MemoryCell, read_code, write_code
+
+
+def build_program(source: str) -> list[MemoryCell]:
+    code, _ = translator.translate(source)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "out.json")
+        write_code(code, target, translator.custom_serializer)
+        return read_code(target)
+
+
+def load_program(source_fn: str) -> list[MemoryCell]:
+    with open(source_fn, encoding="utf-8") as f:
+        return build_program(f.read())
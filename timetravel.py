@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from constants import INSTRUCTIONS_LIMIT
+from exception import HaltProgramError
+from isa import MemoryCell
+from machine import ControlUnit, Port
+
+UNDO_DATA_PUSH = 0
+UNDO_DATA_POP = 1
+UNDO_ADDRESS_PUSH = 2
+UNDO_ADDRESS_POP = 3
+UNDO_MEMORY = 4
+UNDO_READ = 5
+UNDO_WRITE = 6
+UNDO_READ_BLOCK = 7
+UNDO_DELIVER = 8
+
+WORD_BYTES = 8
+ENTRY_BYTES = 128
+EVENT_BYTES = 48
+
+
+@dataclass
+class WriteRecord:
+    instruction: int
+    tick: int
+    pc: int
+    old: int | None
+    new: int
+
+
+@dataclass
+class Snapshot:
+    registers: tuple
+    memory: list[MemoryCell | int]
+    data_stack: list[int]
+    address_stack: list[int]
+    ports: dict[Port, list[int]]
+    schedule: list[tuple[int, Port, int]] | None
+
+    def size(self) -> int:
+        words = len(self.memory) + len(self.data_stack) + len(self.address_stack)
+        words += sum(len(x) for x in self.ports.values()) + len(self.schedule or ())
+        return words * WORD_BYTES + ENTRY_BYTES
+
+
+@dataclass
+class UndoEntry:
+    registers: tuple
+    events: list[tuple] = field(default_factory=list)
+
+
+@dataclass
+class Segment:
+    snapshot: Snapshot
+    entries: list[UndoEntry] = field(default_factory=list)
+    writes: dict[int, WriteRecord] = field(default_factory=dict)
+    size: int = 0
+
+
+def cell_value(cell: MemoryCell | int) -> int | None:
+    if isinstance(cell, MemoryCell):
+        return cell.arg
+    return cell
+
+
+def capture_registers(control_unit: ControlUnit) -> tuple:
+    datapath = control_unit.datapath
+    return (
+        datapath.pc,
+        datapath.data_tos_reg_1,
+        datapath.data_tos_reg_2,
+        datapath.address_tos_reg_1,
+        datapath.alu.z_flag,
+        control_unit.ticks,
+        control_unit.instructions,
+        control_unit.cur_instruction,
+        control_unit.cur_operand,
+        control_unit.interrupts_enabled,
+    )
+
+
+def restore_registers(control_unit: ControlUnit, registers: tuple) -> None:
+    datapath = control_unit.datapath
+    (
+        datapath.pc,
+        datapath.data_tos_reg_1,
+        datapath.data_tos_reg_2,
+        datapath.address_tos_reg_1,
+        datapath.alu.z_flag,
+        control_unit.ticks,
+        control_unit.instructions,
+        control_unit.cur_instruction,
+        control_unit.cur_operand,
+        control_unit.interrupts_enabled,
+    ) = registers
+
+
+class TimeTravelRecorder:
+    def __init__(self, snapshot_interval: int = 256, memory_budget: int = 64 * 1024 * 1024):
+        assert snapshot_interval > 0, "Snapshot interval must be positive"
+        self.snapshot_interval: int = snapshot_interval
+        self.memory_budget: int = memory_budget
+        self.segments: list[Segment] = []
+        self.used: int = 0
+        self.control_unit: ControlUnit | None = None
+        self.entry: UndoEntry | None = None
+
+    def attach(self, control_unit: ControlUnit) -> None:
+        self.control_unit = control_unit
+        self.install(control_unit)
+        self.start_segment()
+
+    def install(self, control_unit: ControlUnit) -> None:
+        datapath = control_unit.datapath
+        io = datapath.io
+        read_data_stack, write_data_stack = datapath.signal_read_data_stack, datapath.signal_write_data_stack
+        read_address_stack = datapath.signal_read_top_of_address_stack
+        write_address_stack = datapath.signal_write_top_address_stack
+        write_mem = datapath.signal_write_mem
+        read, write, read_block, write_block, deliver = io.read, io.write, io.read_block, io.write_block, io.deliver
+
+        def log(*event) -> None:
+            if self.entry is not None:
+                self.entry.events.append(event)
+
+        def signal_read_data_stack() -> int:
+            value = read_data_stack()
+            log(UNDO_DATA_POP, value)
+            return value
+
+        def signal_write_data_stack(value: int) -> None:
+            write_data_stack(value)
+            log(UNDO_DATA_PUSH)
+
+        def signal_read_top_of_address_stack() -> int:
+            value = read_address_stack()
+            log(UNDO_ADDRESS_POP, value)
+            return value
+
+        def signal_write_top_address_stack(value: int) -> None:
+            write_address_stack(value)
+            log(UNDO_ADDRESS_PUSH)
+
+        def signal_write_mem(addr: int, value: int) -> None:
+            old = datapath.memory[addr]
+            write_mem(addr, value)
+            if self.entry is None:
+                return
+            segment = self.segments[-1]
+            log(UNDO_MEMORY, addr, old, segment.writes.get(addr))
+            registers = self.entry.registers
+            segment.writes[addr] = WriteRecord(
+                control_unit.instructions, control_unit.ticks, registers[0], cell_value(old), value
+            )
+
+        def io_read(port: Port) -> int:
+            value = read(port)
+            log(UNDO_READ, port, value)
+            return value
+
+        def io_write(port: Port, value: int) -> None:
+            write(port, value)
+            log(UNDO_WRITE, port, 1)
+
+        def io_read_block(port: Port, count: int) -> list[int]:
+            values = read_block(port, count)
+            log(UNDO_READ_BLOCK, port, list(values))
+            return values
+
+        def io_write_block(port: Port, values: list[int]) -> None:
+            write_block(port, values)
+            log(UNDO_WRITE, port, len(values))
+
+        def io_deliver(tick: int) -> None:
+            count = 0
+            while count < len(io.schedule) and io.schedule[count][0] <= tick:
+                count += 1
+            if count:
+                log(UNDO_DELIVER, io.schedule[:count])
+            deliver(tick)
+
+        datapath.signal_read_data_stack = signal_read_data_stack
+        datapath.signal_write_data_stack = signal_write_data_stack
+        datapath.signal_read_top_of_address_stack = signal_read_top_of_address_stack
+        datapath.signal_write_top_address_stack = signal_write_top_address_stack
+        datapath.signal_write_mem = signal_write_mem
+        io.read, io.write, io.read_block, io.write_block, io.deliver = (
+            io_read,
+            io_write,
+            io_read_block,
+            io_write_block,
+            io_deliver,
+        )
+
+    def take_snapshot(self) -> Snapshot:
+        control_unit = self.control_unit
+        datapath = control_unit.datapath
+        io = datapath.io
+        return Snapshot(
+            capture_registers(control_unit),
+            list(datapath.memory),
+            list(datapath.data_stack),
+            list(datapath.address_stack),
+            {port: list(values) for port, values in io.ports.items()},
+            None if io.schedule is None else list(io.schedule),
+        )
+
+    def restore_snapshot(self, snapshot: Snapshot) -> None:
+        control_unit = self.control_unit
+        datapath = control_unit.datapath
+        io = datapath.io
+        restore_registers(control_unit, snapshot.registers)
+        datapath.memory[:] = snapshot.memory
+        datapath.data_stack[:] = snapshot.data_stack
+        datapath.address_stack[:] = snapshot.address_stack
+        for port, values in snapshot.ports.items():
+            io.ports[port][:] = values
+        if io.schedule is not None:
+            io.schedule[:] = snapshot.schedule
+        if control_unit.call_cache is not None:
+            control_unit.call_cache.abort()
+
+    def start_segment(self) -> None:
+        snapshot = self.take_snapshot()
+        segment = Segment(snapshot, size=snapshot.size())
+        self.segments.append(segment)
+        self.used += segment.size
+        while self.used > self.memory_budget and len(self.segments) > 1:
+            self.used -= self.segments.pop(0).size
+
+    def step(self) -> None:
+        control_unit = self.control_unit
+        if len(self.segments[-1].entries) >= self.snapshot_interval:
+            self.start_segment()
+        self.entry = UndoEntry(capture_registers(control_unit))
+        try:
+            control_unit.decode_and_execute_instruction()
+        finally:
+            segment = self.segments[-1]
+            segment.entries.append(self.entry)
+            size = ENTRY_BYTES + EVENT_BYTES * len(self.entry.events)
+            segment.size += size
+            self.used += size
+            self.entry = None
+
+    def run(self, control_unit: ControlUnit) -> None:
+        self.attach(control_unit)
+        while control_unit.instructions < INSTRUCTIONS_LIMIT:
+            self.step()
+
+    def undo(self, entry: UndoEntry) -> None:
+        control_unit = self.control_unit
+        datapath = control_unit.datapath
+        io = datapath.io
+        segment = self.segments[-1]
+        for event in reversed(entry.events):
+            kind = event[0]
+            if kind == UNDO_DATA_PUSH:
+                datapath.data_stack.pop()
+            elif kind == UNDO_DATA_POP:
+                datapath.data_stack.append(event[1])
+            elif kind == UNDO_ADDRESS_PUSH:
+                datapath.address_stack.pop()
+            elif kind == UNDO_ADDRESS_POP:
+                datapath.address_stack.append(event[1])
+            elif kind == UNDO_MEMORY:
+                _, addr, old, previous = event
+                datapath.memory[addr] = old
+                if previous is None:
+                    segment.writes.pop(addr, None)
+                else:
+                    segment.writes[addr] = previous
+            elif kind == UNDO_READ:
+                io.ports[event[1]].insert(0, event[2])
+            elif kind == UNDO_READ_BLOCK:
+                io.ports[event[1]][:0] = event[2]
+            elif kind == UNDO_WRITE:
+                del io.ports[event[1]][len(io.ports[event[1]]) - event[2] :]
+            else:
+                for _, port, _ in reversed(event[1]):
+                    io.ports[port].pop()
+                io.schedule[:0] = event[1]
+        restore_registers(control_unit, entry.registers)
+
+    def step_back(self) -> bool:
+        while len(self.segments[-1].entries) == 0:
+            if len(self.segments) == 1:
+                return False
+            self.used -= self.segments.pop().size
+        segment = self.segments[-1]
+        entry = segment.entries.pop()
+        self.undo(entry)
+        size = ENTRY_BYTES + EVENT_BYTES * len(entry.events)
+        segment.size -= size
+        self.used -= size
+        if self.control_unit.call_cache is not None:
+            self.control_unit.call_cache.abort()
+        return True
+
+    def run_back_to_tick(self, tick: int) -> bool:
+        index = len(self.segments) - 1
+        while index >= 0 and self.segments[index].snapshot.registers[5] > tick:
+            index -= 1
+        if index < 0:
+            return False
+        for segment in self.segments[index + 1 :]:
+            self.used -= segment.size
+        del self.segments[index + 1 :]
+
+        segment = self.segments[-1]
+        self.restore_snapshot(segment.snapshot)
+        self.used -= segment.size - segment.snapshot.size()
+        segment.size = segment.snapshot.size()
+        segment.entries.clear()
+        segment.writes.clear()
+
+        control_unit = self.control_unit
+        while control_unit.instructions < INSTRUCTIONS_LIMIT:
+            try:
+                self.step()
+            except HaltProgramError:
+                self.step_back()
+                break
+            if control_unit.ticks > tick:
+                self.step_back()
+                break
+        return True
+
+    def last_write(self, addr: int) -> WriteRecord | None:
+        for segment in reversed(self.segments):
+            if addr in segment.writes:
+                return segment.writes[addr]
+        return None
+
+    def oldest_tick(self) -> int:
+        return self.segments[0].snapshot.registers[5]
@@ -0,0 +1,118 @@
+import io
+
+import pytest
+from constants import INSTRUCTIONS_LIMIT
+from debugger import Debugger
+from machine import ControlUnit, simulation, uniform_input_schedule
+from program_loader import load_program
+from timetravel import TimeTravelRecorder, capture_registers, cell_value
+
+HELLO = [5, *[ord(x) for x in "hello"]]
+
+
+def machine_state(control_unit: ControlUnit) -> tuple:
+    datapath = control_unit.datapath
+    return (
+        capture_registers(control_unit),
+        [cell_value(x) for x in datapath.memory],
+        list(datapath.data_stack),
+        list(datapath.address_stack),
+        {port: list(values) for port, values in datapath.io.ports.items()},
+        None if datapath.io.schedule is None else list(datapath.io.schedule),
+    )
+
+
+def reference_states(code, input_data, schedule) -> list[tuple]:
+    states = []
+
+    def runner(control_unit: ControlUnit) -> None:
+        states.append(machine_state(control_unit))
+        while control_unit.instructions < INSTRUCTIONS_LIMIT:
+            control_unit.decode_and_execute_instruction()
+            states.append(machine_state(control_unit))
+
+    simulation(code, list(input_data), schedule, runner=runner)
+    return states
+
+
+def record(code, input_data, schedule, recorder: TimeTravelRecorder) -> ControlUnit:
+    control_units = []
+
+    def runner(control_unit: ControlUnit) -> None:
+        control_units.append(control_unit)
+        recorder.run(control_unit)
+
+    simulation(code, list(input_data), schedule, runner=runner)
+    return control_units[0]
+
+
+PROGRAMS = [
+    ("examples/cat_interrupt.txt", HELLO, 60),
+    ("examples/porb2.txt", [0], None),
+    ("examples/pure_calls.txt", [0], None),
+]
+
+
+@pytest.mark.parametrize(("source", "input_data", "interval"), PROGRAMS)
+def test_step_back_restores_every_state(source, input_data, interval):
+    code = load_program(source)
+    schedule = None if interval is None else uniform_input_schedule(input_data, interval)
+    states = reference_states(code, input_data, schedule)
+    recorder = TimeTravelRecorder(snapshot_interval=16)
+    control_unit = record(code, input_data, schedule, recorder)
+
+    for expected in reversed(states[:-1] if len(states) > control_unit.instructions else states):
+        assert recorder.step_back()
+        assert machine_state(control_unit) == expected
+    assert not recorder.step_back()
+
+
+@pytest.mark.parametrize(("source", "input_data", "interval"), PROGRAMS)
+def test_run_back_to_tick(source, input_data, interval):
+    code = load_program(source)
+    schedule = None if interval is None else uniform_input_schedule(input_data, interval)
+    states = reference_states(code, input_data, schedule)
+    last_tick = states[-1][0][5]
+
+    for tick in [states[0][0][5], 49, last_tick // 3, last_tick // 2, last_tick - 1]:
+        recorder = TimeTravelRecorder(snapshot_interval=16)
+        control_unit = record(code, input_data, schedule, recorder)
+        assert recorder.run_back_to_tick(tick)
+        expected = max(i for i, state in enumerate(states) if state[0][5] <= tick)
+        assert machine_state(control_unit) == states[expected]
+
+
+def test_last_write_and_memory_budget():
+    code = load_program("examples/cat.txt")
+    states = reference_states(code, HELLO, None)
+    recorder = TimeTravelRecorder(snapshot_interval=16)
+    record(code, HELLO, None, recorder)
+    for addr in range(len(code)):
+        changes = [i for i in range(1, len(states)) if states[i][1][addr] != states[i - 1][1][addr]]
+        write = recorder.last_write(addr)
+        if not changes:
+            assert write is None
+            continue
+        assert write.instruction == states[changes[-1]][0][6]
+        assert (write.old, write.new) == (states[changes[-1] - 1][1][addr], states[changes[-1]][1][addr])
+
+    code = load_program("examples/cat_interrupt.txt")
+    schedule = uniform_input_schedule(HELLO, 60)
+    small = TimeTravelRecorder(snapshot_interval=8, memory_budget=recorder.segments[0].snapshot.size() * 3)
+    control_unit = record(code, HELLO, schedule, small)
+    assert small.oldest_tick() > 2
+    assert not small.run_back_to_tick(2)
+    while small.step_back():
+        pass
+    assert control_unit.ticks == small.oldest_tick()
+
+
+def test_debugger_steps_back_after_halt():
+    code = load_program("examples/cat.txt")
+    stdout = io.StringIO()
+    debugger = Debugger(io.StringIO("sb\nsb\ni\nc\nc\n"), stdout, TimeTravelRecorder())
+
+    assert simulation(code, list(HELLO), runner=debugger.run) == simulation(code, list(HELLO))
+    output = stdout.getvalue()
+    assert output.count("(halt)") == 2
+    assert output.count("(debug) at pc") == 2
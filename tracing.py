@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import logging
+import sys
+import unicodedata
+import zlib
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from constants import INSTRUCTIONS_LIMIT
+from exception import HaltProgramError
+from isa import MemoryCell, Opcode, read_code
+from machine import STDOUT, ControlUnit, DataPath, Port, format_state, read_input, simulation, uniform_input_schedule
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+TRACE_MAGIC: bytes = b"SMTR\x01"
+
+OPCODES: list[Opcode] = list(Opcode)
+OPCODE_INDEX: dict[Opcode, int] = {opcode: i for i, opcode in enumerate(OPCODES)}
+
+KIND_INSTRUCTION = 0
+KIND_INTERRUPT = 1
+KIND_END = 2
+
+FLAG_Z = 1 << 2
+FLAG_OPERAND = 1 << 3
+FLAG_OPCODE = 1 << 4
+FLAG_INSTRUCTION_LIMIT = 1 << 5
+
+IO_READ = 0
+IO_WRITE = 1
+IO_READ_BLOCK = 2
+IO_WRITE_BLOCK = 3
+
+SILENT_OPCODES: set[Opcode] = {Opcode.IN, Opcode.OUT}
+
+CONTROL_FLOW_EXECUTORS: dict[Opcode, str] = {
+    Opcode.JMP: "execute_jmp",
+    Opcode.JZ: "execute_jz",
+    Opcode.JNZ: "execute_jnz",
+    Opcode.HALT: "execute_halt",
+    Opcode.CALL: "execute_call",
+    Opcode.RET: "execute_ret",
+    Opcode.IRET: "execute_iret",
+}
+
+NON_PRINTABLE_CATEGORIES: list[str] = ["Cc", "Cf", "Cs", "Co", "Cn", "Zl", "Zp"]
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    return (result >> 1) ^ -(result & 1), pos
+
+
+@dataclass
+class TraceRecord:
+    kind: int
+    opcode: Opcode | None
+    operand: int | None
+    pc: int
+    ticks: int
+    data_tos_reg_1: int
+    data_tos_reg_2: int
+    address_tos_reg_1: int
+    z_flag: int
+    data_stack: list[int]
+    address_stack: list[int]
+    memory_writes: list[tuple[int, int]] = field(default_factory=list)
+    io_events: list[tuple[int, int, list[int]]] = field(default_factory=list)
+
+    def state(self) -> tuple:
+        return (
+            self.kind,
+            self.opcode,
+            self.operand,
+            self.pc,
+            self.ticks,
+            self.data_tos_reg_1,
+            self.data_tos_reg_2,
+            self.address_tos_reg_1,
+            self.z_flag,
+            self.data_stack,
+            self.address_stack,
+            self.memory_writes,
+            self.io_events,
+        )
+
+
+class TraceRecorder:
+    def __init__(self):
+        self.buffer: bytearray = bytearray()
+        self.records: int = 0
+        self.prev: list[int] = [0, 0, 0, 0, 0]
+        self.prev_opcode: Opcode | None = None
+        self.data_pops: int = 0
+        self.data_base: int = 0
+        self.address_pops: int = 0
+        self.address_base: int = 0
+        self.memory_writes: list[tuple[int, int]] = []
+        self.io_events: list[tuple[int, int, list[int]]] = []
+        self.instruction_limit: bool = False
+
+    def install(self, control_unit: ControlUnit) -> None:
+        datapath: DataPath = control_unit.datapath
+        io = datapath.io
+        read_data_stack = datapath.signal_read_data_stack
+        read_address_stack = datapath.signal_read_top_of_address_stack
+        write_mem = datapath.signal_write_mem
+        read, write, read_block, write_block = io.read, io.write, io.read_block, io.write_block
+        enter_interrupt = control_unit.enter_interrupt
+
+        def signal_read_data_stack() -> int:
+            if len(datapath.data_stack) <= self.data_base:
+                self.data_pops += 1
+                self.data_base -= 1
+            return read_data_stack()
+
+        def signal_read_top_of_address_stack() -> int:
+            if len(datapath.address_stack) <= self.address_base:
+                self.address_pops += 1
+                self.address_base -= 1
+            return read_address_stack()
+
+        def signal_write_mem(addr: int, value: int) -> None:
+            self.memory_writes.append((addr, value))
+            write_mem(addr, value)
+
+        def io_read(port: Port) -> int:
+            value = read(port)
+            self.io_events.append((IO_READ, port.value, [value]))
+            return value
+
+        def io_write(port: Port, value: int) -> None:
+            write(port, value)
+            self.io_events.append((IO_WRITE, port.value, [value]))
+
+        def io_read_block(port: Port, count: int) -> list[int]:
+            values = read_block(port, count)
+            self.io_events.append((IO_READ_BLOCK, port.value, list(values)))
+            return values
+
+        def io_write_block(port: Port, values: list[int]) -> None:
+            write_block(port, values)
+            self.io_events.append((IO_WRITE_BLOCK, port.value, list(values)))
+
+        def interrupt() -> None:
+            enter_interrupt()
+            self.record(control_unit, KIND_INTERRUPT)
+
+        datapath.signal_read_data_stack = signal_read_data_stack
+        datapath.signal_read_top_of_address_stack = signal_read_top_of_address_stack
+        datapath.signal_write_mem = signal_write_mem
+        io.read, io.write, io.read_block, io.write_block = io_read, io_write, io_read_block, io_write_block
+        control_unit.enter_interrupt = interrupt
+        self.data_base = len(datapath.data_stack)
+        self.address_base = len(datapath.address_stack)
+
+    def record(self, control_unit: ControlUnit, kind: int) -> None:
+        datapath = control_unit.datapath
+        buffer = self.buffer
+        opcode = control_unit.cur_instruction
+        operand = control_unit.cur_operand
+
+        flags = kind
+        if datapath.alu.z_flag:
+            flags |= FLAG_Z
+        if operand is not None:
+            flags |= FLAG_OPERAND
+        if opcode != self.prev_opcode:
+            flags |= FLAG_OPCODE
+        buffer.append(flags)
+        if flags & FLAG_OPCODE:
+            buffer.append(OPCODE_INDEX[opcode])
+            self.prev_opcode = opcode
+        if operand is not None:
+            write_varint(buffer, operand)
+
+        prev = self.prev
+        current = [
+            datapath.pc,
+            control_unit.ticks,
+            datapath.data_tos_reg_1,
+            datapath.data_tos_reg_2,
+            datapath.address_tos_reg_1,
+        ]
+        for i in range(5):
+            write_varint(buffer, current[i] - prev[i])
+        self.prev = current
+
+        for stack, pops, base in (
+            (datapath.data_stack, self.data_pops, self.data_base),
+            (datapath.address_stack, self.address_pops, self.address_base),
+        ):
+            write_varint(buffer, pops)
+            write_varint(buffer, len(stack) - base)
+            for value in stack[base:]:
+                write_varint(buffer, value)
+
+        write_varint(buffer, len(self.memory_writes))
+        for addr, value in self.memory_writes:
+            write_varint(buffer, addr)
+            write_varint(buffer, value)
+
+        write_varint(buffer, len(self.io_events))
+        for event, port, values in self.io_events:
+            buffer.append(event)
+            write_varint(buffer, port)
+            write_varint(buffer, len(values))
+            for value in values:
+                write_varint(buffer, value)
+
+        self.records += 1
+        self.data_pops = self.address_pops = 0
+        self.data_base = len(datapath.data_stack)
+        self.address_base = len(datapath.address_stack)
+        self.memory_writes = []
+        self.io_events = []
+
+    def run(self, control_unit: ControlUnit) -> None:
+        self.install(control_unit)
+        try:
+            while control_unit.instructions < INSTRUCTIONS_LIMIT:
+                control_unit.decode_and_execute_instruction()
+                self.record(control_unit, KIND_INSTRUCTION)
+        except HaltProgramError:
+            self.record(control_unit, KIND_INSTRUCTION)
+            raise
+        finally:
+            self.instruction_limit = control_unit.instructions == INSTRUCTIONS_LIMIT
+
+    def dump(self) -> bytes:
+        end = bytearray([KIND_END | (FLAG_INSTRUCTION_LIMIT if self.instruction_limit else 0)])
+        return TRACE_MAGIC + zlib.compress(bytes(self.buffer + end), 9)
+
+
+def read_trace(data: bytes) -> Iterator[TraceRecord]:
+    assert data.startswith(TRACE_MAGIC), "Not a trace file"
+    payload = zlib.decompress(data[len(TRACE_MAGIC) :])
+    pos = 0
+    prev = [0, 0, 0, 0, 0]
+    opcode: Opcode | None = None
+    data_stack: list[int] = []
+    address_stack: list[int] = []
+    while True:
+        flags = payload[pos]
+        pos += 1
+        kind = flags & 0b11
+        if kind == KIND_END:
+            return
+        if flags & FLAG_OPCODE:
+            opcode = OPCODES[payload[pos]]
+            pos += 1
+        operand = None
+        if flags & FLAG_OPERAND:
+            operand, pos = read_varint(payload, pos)
+        for i in range(5):
+            delta, pos = read_varint(payload, pos)
+            prev[i] += delta
+
+        for stack in (data_stack, address_stack):
+            pops, pos = read_varint(payload, pos)
+            count, pos = read_varint(payload, pos)
+            if pops:
+                del stack[len(stack) - pops :]
+            for _ in range(count):
+                value, pos = read_varint(payload, pos)
+                stack.append(value)
+
+        memory_writes: list[tuple[int, int]] = []
+        count, pos = read_varint(payload, pos)
+        for _ in range(count):
+            addr, pos = read_varint(payload, pos)
+            value, pos = read_varint(payload, pos)
+            memory_writes.append((addr, value))
+
+        io_events: list[tuple[int, int, list[int]]] = []
+        count, pos = read_varint(payload, pos)
+        for _ in range(count):
+            event = payload[pos]
+            port, pos = read_varint(payload, pos + 1)
+            length, pos = read_varint(payload, pos)
+            values = []
+            for _ in range(length):
+                value, pos = read_varint(payload, pos)
+                values.append(value)
+            io_events.append((event, port, values))
+
+        yield TraceRecord(
+            kind,
+            opcode,
+            operand,
+            *prev,
+            int(bool(flags & FLAG_Z)),
+            list(data_stack),
+            list(address_stack),
+            memory_writes,
+            io_events,
+        )
+
+
+def trace_hit_instruction_limit(data: bytes) -> bool:
+    payload = zlib.decompress(data[len(TRACE_MAGIC) :])
+    return bool(payload[-1] & FLAG_INSTRUCTION_LIMIT)
+
+
+def executor_names() -> dict[Opcode, str]:
+    executors = ControlUnit(DataPath([], None)).executors
+    return {**{opcode: executor.__name__ for opcode, executor in executors.items()}, **CONTROL_FLOW_EXECUTORS}
+
+
+def render_io_event(event: int, values: list[int], stdout: list[int]) -> str:
+    if event == IO_READ:
+        value = values[0]
+        if unicodedata.category(chr(value)) in NON_PRINTABLE_CATEGORIES:
+            return f"DEBUG: read:IN: {value}\n\n"
+        return f"DEBUG: read:IN: {value} - {chr(value)}\n\n"
+    if event == IO_READ_BLOCK:
+        return f"DEBUG: read_block:INS: {values}\n\n"
+    if event == IO_WRITE:
+        try:
+            return f"DEBUG: write: OUT: {''.join([chr(x) for x in stdout])} << {values[0]} - {chr(values[0])}\n\n"
+        except ValueError:
+            return f"DEBUG: write: OUT: {stdout}\n\n"
+    try:
+        written = "".join([chr(x) for x in values])
+        return f"DEBUG: write_block: OUTS: {''.join([chr(x) for x in stdout])} << {written}\n\n"
+    except ValueError:
+        return f"DEBUG: write_block: OUTS: {stdout}\n\n"
+
+
+def render_log(data: bytes) -> str:
+    lines: list[str] = []
+    stdout: list[int] = []
+    names: dict[Opcode, str] = executor_names()
+    for record in read_trace(data):
+        for event, port, values in record.io_events:
+            if event in (IO_WRITE, IO_WRITE_BLOCK) and port == STDOUT.value:
+                stdout.extend(values)
+            lines.append(render_io_event(event, values, stdout))
+        if record.kind == KIND_INSTRUCTION and record.opcode in SILENT_OPCODES:
+            continue
+        name = "enter_interrupt" if record.kind == KIND_INTERRUPT else names[record.opcode]
+        state = format_state(
+            record.ticks,
+            record.pc,
+            record.data_tos_reg_1,
+            record.data_tos_reg_2,
+            record.address_tos_reg_1,
+            record.z_flag,
+            record.data_stack,
+            record.address_stack,
+            record.opcode,
+            record.operand,
+        )
+        lines.append(f"DEBUG: {name}:{state}\n")
+    if trace_hit_instruction_limit(data):
+        lines.append("WARNING: simulation:Instruction limit\n")
+    return "".join(lines)
+
+
+def first_divergence(left: bytes, right: bytes) -> tuple[int, TraceRecord | None, TraceRecord | None] | None:
+    left_records = read_trace(left)
+    right_records = read_trace(right)
+    index = 0
+    while True:
+        a = next(left_records, None)
+        b = next(right_records, None)
+        if a is None and b is None:
+            return None
+        if a is None or b is None or a.state() != b.state():
+            return index, a, b
+        index += 1
+
+
+def describe_divergence(left: bytes, right: bytes) -> str:
+    divergence = first_divergence(left, right)
+    if divergence is None:
+        return "traces are identical"
+    index, a, b = divergence
+    if a is None or b is None:
+        shorter = "left" if a is None else "right"
+        tick = (a or b).ticks
+        return f"{shorter} trace ends at step {index} (tick {tick} in the other trace)"
+    fields = [name for name, x, y in zip(TraceRecord.__dataclass_fields__, a.state(), b.state()) if x != y]
+    return f"first divergence at step {index}, tick {min(a.ticks, b.ticks)}, fields: {', '.join(fields)}\n" + "\n".join(
+        f"{side}: {record}" for side, record in (("left", a), ("right", b))
+    )
+
+
+def record_trace(
+    code: list[MemoryCell], input_data: list[int], input_schedule: list[int] | None = None
+) -> tuple[tuple[list[int], int, int], bytes]:
+    recorder = TraceRecorder()
+    res = simulation(code, input_data, input_schedule, runner=recorder.run)
+    return res, recorder.dump()
+
+
+def main(command: str, args: list[str]) -> None:
+    if command == "record":
+        source_code_fn, input_data_fn, trace_fn, *interval = args
+        input_str = read_input(input_data_fn)
+        schedule = uniform_input_schedule(input_str, int(interval[0])) if interval else None
+        res, data = record_trace(read_code(source_code_fn), input_str, schedule)
+        with open(trace_fn, "wb") as f:
+            f.write(data)
+        print(f"instruction_count: {res[1]}, ticks: {res[2]}, trace bytes: {len(data)}")
+    elif command == "replay":
+        with open(args[0], "rb") as f:
+            print(render_log(f.read()).strip())
+    else:
+        assert command == "diff", f"Unknown command {command}"
+        with open(args[0], "rb") as f, open(args[1], "rb") as g:
+            print(describe_divergence(f.read(), g.read()))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 3, (
+        "Usage: tracing.py record <machine_code_file> <input_file> <trace_file> <arrival_interval> - optional | "
+        "tracing.py replay <trace_file> | tracing.py diff <trace_file> <trace_file>"
+    )
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(funcName)s:%(message)s")
+    main(sys.argv[1], sys.argv[2:])
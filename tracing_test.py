@@ -0,0 +1,41 @@
+import pytest
+import translator
+from isa import read_code
+from machine import simulation, uniform_input_schedule
+from program_loader import load_program
+from tracing import describe_divergence, first_divergence, read_trace, record_trace, render_log
+
+
+@pytest.mark.golden_test("golden/*.yml")
+def test_replay_renders_golden_log(golden, tmp_path):
+    input_data = [ord(x) for x in golden["in_stdin"]]
+    input_data.insert(0, len(input_data))
+    interval = golden.get("in_arrival_interval")
+    schedule = uniform_input_schedule(input_data, interval) if interval else None
+    source = tmp_path / "source.txt"
+    target = tmp_path / "out.json"
+    source.write_text(golden["in_source"], encoding="utf-8")
+    translator.main(str(source), str(target))
+
+    code = read_code(str(target))
+    res, data = record_trace(code, list(input_data), schedule)
+
+    assert res == simulation(code, list(input_data), schedule)
+    assert render_log(data).strip() == golden.out["out_log"]
+    assert len(data) * 5 < len(golden.out["out_log"])
+
+
+def test_first_divergence():
+    code = load_program("examples/cat.txt")
+    _, hello = record_trace(code, [5, *[ord(x) for x in "hello"]])
+    _, help_ = record_trace(code, [5, *[ord(x) for x in "help!"]])
+
+    assert first_divergence(hello, hello) is None
+    assert describe_divergence(hello, hello) == "traces are identical"
+
+    index, a, b = first_divergence(hello, help_)
+    records = list(read_trace(hello))
+    assert records[index] == a
+    assert a.io_events != b.io_events
+    assert a.ticks == b.ticks
+    assert "first divergence at step" in describe_divergence(hello, help_)
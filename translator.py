@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import json
 import re
 import sys
 
+from constants import BYTE_SIZE, INTERRUPT_VECTOR_NAME
 from exception import LabelNotDefinedError, UnexpectedVariableError, VariableOrLabelNotDefinedError
-from isa import MachineWord, Opcode, Variable, command2opcode, write_code
+from isa import MachineWord, Opcode, Variable, command2opcode, pack_bytes, write_code
 
 
 class Program:
@@ -13,6 +15,7 @@ class Program:
         self.current_command_addr: int = 0
         self.variables: dict[str, Variable] = {}
         self.labels: dict[str, int] = {}
+        self.lines: dict[int, tuple[int, str]] = {}
 
     def add_instruction(self, index: int, opcode: Opcode, arg: int | list[int]):
         self.machine_code.append(MachineWord(index, opcode, arg))
@@ -30,6 +33,11 @@ def clean_code(src_code: str) -> list[str]:
     return [x for x in remove_indent(remove_comments(src_code)) if x != ""]
 
 
+def clean_code_lines(src_code: str) -> list[tuple[int, str]]:
+    lines = remove_indent(remove_comments(src_code))
+    return [(number, x) for number, x in enumerate(lines, start=1) if x != ""]
+
+
 def is_variable_exist(program: Program, variable: str) -> bool:
     for i in program.variables:
         if i == variable:
@@ -64,18 +72,32 @@ def is_string(s: str) -> bool:
     return bool(re.match(r'"[><\w\s,.:;!?()\\-]+"', s))
 
 
+def is_packed_string(s: str) -> bool:
+    return bool(re.match(r'^\.packed\s+"[><\w\s,.:;!?()\\-]+"$', s))
+
+
 def is_malloc_request(s: str) -> bool:
     return bool(re.match(r"^bf", s))
 
 
-def translate_section_data(data_block: list[str], program: Program) -> None:
-    program.machine_code.append(Variable("start_address", program.current_command_addr, None))
-    program.current_command_addr += 1
+def translate_section_data(data_block: list[str], program: Program, start_address: bool = True) -> None:
+    if start_address:
+        program.machine_code.append(Variable("start_address", program.current_command_addr, None))
+        program.current_command_addr += 1
     for data in data_block:
         decl = [x.strip() for x in data.split(":", 1)]
         var_name: str = decl[0]
         var_value: str = decl[1]
         assert not is_variable_exist(program, var_name), f"Variable {var_name} is already defined"
+        if var_name == INTERRUPT_VECTOR_NAME:
+            assert not program.variables, (
+                f"Variable {INTERRUPT_VECTOR_NAME} must be the first variable in section .data"
+            )
+            assert is_variable(var_value), f"Variable {INTERRUPT_VECTOR_NAME} must reference a label"
+            program.variables[var_name] = Variable(var_name, program.current_command_addr, var_value)
+            program.machine_code.append(Variable(var_name, program.current_command_addr, var_value))
+            program.current_command_addr += 1
+            continue
         if is_malloc_request(var_value):
             arg: str = [x.strip() for x in var_value.split(" ")][1]
             assert is_number(arg), f"Variable {var_name} is not a number"
@@ -106,6 +128,15 @@ def translate_section_data(data_block: list[str], program: Program) -> None:
             for i in transformed_string:
                 program.machine_code.append(Variable(var_name, program.current_command_addr, i))
                 program.current_command_addr += 1
+        elif is_packed_string(var_value):
+            chars = [ord(x) for x in var_value.split('"')[1]]
+            assert all(x < 2**BYTE_SIZE for x in chars), f"Packed string {var_name} contains non 8-bit characters"
+            program.variables[var_name] = Variable(var_name, program.current_command_addr, len(chars))
+            program.machine_code.append(Variable(var_name, program.current_command_addr, len(chars)))
+            program.current_command_addr += 1
+            for i in pack_bytes(chars):
+                program.machine_code.append(Variable(var_name, program.current_command_addr, i))
+                program.current_command_addr += 1
         else:
             raise UnexpectedVariableError(var_value)
 
@@ -125,16 +156,18 @@ def get_variable_addr(var: Variable, program: Program) -> MachineWord | Variable
     return None
 
 
-def translate_section_text(command_block: list[str], program: Program) -> None:
-    for i in command_block:
+def translate_section_text(command_block: list[str], program: Program, line_numbers: list[int] | None = None) -> None:
+    for index, i in enumerate(command_block):
         if is_label(i):
             program.labels[i.strip()[:-1]] = program.current_command_addr
             continue
+        if line_numbers is not None and i.strip() != "":
+            program.lines[program.current_command_addr] = (line_numbers[index], i.strip())
 
         command_and_arg = i.strip().split(" ")
         if len(command_and_arg) == 2:
             opcode = command2opcode(command_and_arg[0])
-            if opcode in {Opcode.JMP, Opcode.JZ, Opcode.JNZ, Opcode.CALL}:
+            if opcode in {Opcode.JMP, Opcode.JZ, Opcode.JNZ, Opcode.CALL, Opcode.SPAWN}:
                 program.machine_code.append(MachineWord(program.current_command_addr, opcode, command_and_arg[1]))
                 program.current_command_addr += 1
                 continue
@@ -191,6 +224,14 @@ def resolve_addresses(program: Program):
         ):
             raise VariableOrLabelNotDefinedError(program.machine_code[i].arg)
 
+    for i in program.machine_code:
+        if isinstance(i, Variable) and i.name == INTERRUPT_VECTOR_NAME:
+            i.value = get_label_addr_by_name(program, str(i.value))
+            program.variables[i.name].value = i.value
+    assert INTERRUPT_VECTOR_NAME in program.variables or not any(
+        isinstance(i, MachineWord) and i.opcode == Opcode.EI for i in program.machine_code
+    ), f"Instruction ei requires variable {INTERRUPT_VECTOR_NAME} in section .data"
+
     for i in program.machine_code:
         if isinstance(i, MachineWord):
             program.machine_code[0].value = i.index
@@ -198,8 +239,14 @@ def resolve_addresses(program: Program):
 
 
 def translate(src_code: str) -> tuple[list[MachineWord | Variable], int]:
+    program = translate_program(src_code)
+    return program.machine_code, abs(len(program.variables) - len(program.machine_code))
+
+
+def translate_program(src_code: str) -> Program:
     program = Program()
-    src_code = clean_code(src_code)
+    numbered_code = clean_code_lines(src_code)
+    src_code = [x for _, x in numbered_code]
 
     section_data_index_start = [x for x in range(len(src_code)) if src_code[x] == "section .data:"]
     assert len(section_data_index_start) == 1, "Translation error: data section not found or is in multiple places"
@@ -209,11 +256,28 @@ def translate(src_code: str) -> tuple[list[MachineWord | Variable], int]:
     data_block = src_code[section_data_index_start[0] + 1 : section_text_start_index[0]]
     commands_block = src_code[section_text_start_index[0] + 1 : len(src_code) + 1]
 
+    line_numbers = [number for number, _ in numbered_code[section_text_start_index[0] + 1 :]]
+
     translate_section_data(data_block, program)
-    translate_section_text(commands_block, program)
+    translate_section_text(commands_block, program, line_numbers)
     resolve_addresses(program)
 
-    return program.machine_code, abs(len(program.variables) - len(program.machine_code))
+    return program
+
+
+def source_map(program: Program) -> dict:
+    return {
+        "instructions": [
+            {"addr": addr, "line": line, "text": text} for addr, (line, text) in sorted(program.lines.items())
+        ],
+        "labels": program.labels,
+        "variables": {name: var.addr for name, var in program.variables.items()},
+    }
+
+
+def write_source_map(program: Program, fn: str) -> None:
+    with open(fn, "w", encoding="utf-8") as f:
+        f.write(json.dumps(source_map(program), indent=1))
 
 
 def custom_serializer(obj: Variable | MachineWord) -> object | None:
@@ -226,17 +290,19 @@ def custom_serializer(obj: Variable | MachineWord) -> object | None:
     return None
 
 
-def main(source: str, target: str) -> None:
+def main(source: str, target: str, map_target: str | None = None) -> None:
     with open(source, encoding="utf-8") as f:
         src = f.read()
 
-    s, instr = translate(src)
+    program = translate_program(src)
+    s = program.machine_code
 
     write_code(s, target, custom_serializer)
+    if map_target is not None:
+        write_source_map(program, map_target)
     print(f"source LoC: {len(src.splitlines())} code instr: {len(s)}")
 
 
 if __name__ == "__main__":
-    assert len(sys.argv) == 3, "Usage: python main.py <source_file> <target_file>"
-    _, source_code, target_file = sys.argv
-    main(source_code, target_file)
+    assert 4 >= len(sys.argv) >= 3, "Usage: python main.py <source_file> <target_file> <source_map_file> - optional"
+    main(*sys.argv[1:])